@@ -0,0 +1,55 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import ACTIVITY_FACTORS, Profile
+
+DEFAULT_CALORIE_GOAL = Decimal('2000.00')
+
+
+def get_profile_cache():
+    return caches[getattr(settings, 'PROFILE_CACHE', 'default')]
+
+
+def profile_cache_key(user_id):
+    return f'accounts:profile:{user_id}'
+
+
+def build_profile_goal(profile):
+    """The calorie goal figures derived from a Profile, in a cache-friendly dict."""
+    if profile is None:
+        return {'daily_calorie_goal': DEFAULT_CALORIE_GOAL, 'bmr': None, 'activity_factor': ACTIVITY_FACTORS['sedentary']}
+    return {
+        'daily_calorie_goal': Decimal(profile.daily_calorie_goal).quantize(Decimal('0.01')),
+        'bmr': profile.calculate_bmr() if profile.has_goal_inputs() else None,
+        'activity_factor': ACTIVITY_FACTORS['sedentary'],
+    }
+
+
+def get_profile_goal(user):
+    """
+    Return the user's daily calorie goal, BMR and activity factor, reading the
+    Profile only on a cache miss (or from ``user.profile`` when it was already
+    joined in by ProfileModelBackend).
+    """
+    cache = get_profile_cache()
+    key = profile_cache_key(user.pk)
+    goal = cache.get(key)
+    if goal is None:
+        if 'profile' in user._state.fields_cache:
+            # None when the join found no profile
+            profile = user._state.fields_cache.get('profile')
+        else:
+            profile = Profile.objects.filter(user_id=user.pk).first()
+        goal = build_profile_goal(profile)
+        cache.set(key, goal)
+    return goal
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def invalidate_profile_goal(sender, instance, **kwargs):
+    get_profile_cache().delete(profile_cache_key(instance.user_id))
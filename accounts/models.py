@@ -14,6 +14,14 @@ suger_type_choises = (
     ('Normal' , 'Normal')
 )
 
+# Multipliers applied to the BMR for each activity level
+ACTIVITY_FACTORS = {
+    'sedentary': 1.2,  # Little or no exercise
+    'lightly_active': 1.375,  # Light exercise or sports 1-3 days a week
+    'moderately_active': 1.55,  # Moderate exercise or sports 3-5 days a week
+    'very_active': 1.725,  # Hard exercise or sports 6-7 days a week
+}
+
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     phone_number = models.CharField(max_length=15)
@@ -42,25 +50,33 @@ class Profile(models.Model):
         """Calculate the total daily calorie requirement based on activity level."""
         bmr = self.calculate_bmr()
 
-        # Apply activity factor based on the activity level
-        activity_factors = {
-            'sedentary': 1.2,  # Little or no exercise
-            'lightly_active': 1.375,  # Light exercise or sports 1-3 days a week
-            'moderately_active': 1.55,  # Moderate exercise or sports 3-5 days a week
-            'very_active': 1.725,  # Hard exercise or sports 6-7 days a week
-        }
-
-        # Default to 'sedentary' if no activity level is provided
-        activity_factor = activity_factors.get(activity_level, 1.2)
+        # Apply activity factor based on the activity level, defaulting to 'sedentary'
+        activity_factor = ACTIVITY_FACTORS.get(activity_level, ACTIVITY_FACTORS['sedentary'])
         
         # Calculate the total daily calorie goal
         daily_calorie_goal = bmr * activity_factor
         return Decimal(daily_calorie_goal)
 
-    # Automatically update the daily_calorie_goal when the profile is created or updated
+    def goal_inputs(self):
+        """The fields the daily calorie goal is derived from."""
+        return (self.gender, self.weight, self.height, self.age)
+
+    def has_goal_inputs(self):
+        return None not in (self.weight, self.height, self.age)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_goal_inputs = instance.goal_inputs()
+        return instance
+
+    # Update the daily_calorie_goal when the fields it depends on change
     def save(self, *args, **kwargs):
-        self.daily_calorie_goal = self.calculate_daily_calorie_goal()
+        goal_inputs = self.goal_inputs()
+        if self.has_goal_inputs() and goal_inputs != getattr(self, '_saved_goal_inputs', None):
+            self.daily_calorie_goal = self.calculate_daily_calorie_goal()
         super().save(*args, **kwargs)
+        self._saved_goal_inputs = goal_inputs
     
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
@@ -1,3 +1,29 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from .backends import ProfileModelBackend
+from .cache import DEFAULT_CALORIE_GOAL, get_profile_goal
+from .models import Profile
+
+
+class ProfileGoalTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='noprofile', password='pw')
+        Profile.objects.filter(user=self.user).delete()  # created by the post_save signal
+
+    def test_user_loaded_without_a_profile_gets_the_default_goal(self):
+        user = ProfileModelBackend().get_user(self.user.pk)
+
+        self.assertEqual(get_profile_goal(user)['daily_calorie_goal'], DEFAULT_CALORIE_GOAL)
+
+    def test_session_user_without_a_profile_gets_calorie_info(self):
+        self.client.force_login(self.user, backend='accounts.backends.ProfileModelBackend')
+
+        response = self.client.get(reverse('diet:get_calorie_info'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['calorie_goal'], str(DEFAULT_CALORIE_GOAL))
@@ -1,8 +1,10 @@
 from django.contrib import admin
 from django.contrib import admin
-from .models import StepHistory, Food, Meal
+from .models import StepHistory, Food, Meal, DailySummary, StepSampleKey
 # Register your models here.
 
 admin.site.register(StepHistory)
 admin.site.register(Food)
 admin.site.register(Meal)
+admin.site.register(DailySummary)
+admin.site.register(StepSampleKey)
@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class DietConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "diet"
+
+    def ready(self):
+        from . import catalogue, summary  # noqa: F401 (connects the model signals)
+        from .search import create_food_fts
+
+        post_migrate.connect(create_food_fts, sender=self)
@@ -0,0 +1,162 @@
+# async_views.py
+"""
+ASGI-native versions of the hot read endpoints in views.py.
+
+DRF 3.15 has no async views, so these are plain Django coroutines that
+authenticate with the DRF authentication classes, query through the async ORM
+and render with DRF's JSONRenderer, producing the same bodies as their
+synchronous counterparts.
+"""
+import asyncio
+from decimal import Decimal
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.http import parse_etags
+from rest_framework import exceptions
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from accounts.cache import get_profile_goal
+from .catalogue import get_cached_catalogue, get_catalogue
+from .encoders import FastJSONRenderer, row_encoder
+from .models import DailySummary, Meal, StepHistory
+from .pagination import parse_date_param, parse_page_size
+from .queries import apaginate_meals
+from .search import asearch_foods, parse_search_page
+from .serializers import FoodSerializer, StepHistorySerializer
+from .steps import abucket_step_history, parse_step_window
+
+
+def json_response(data, status=200, headers=None, renderer_class=JSONRenderer):
+    return HttpResponse(
+        renderer_class().render(data), status=status, headers=headers, content_type='application/json',
+    )
+
+
+def authenticate_request(request):
+    """Run the DRF authentication classes on a Django request; returns the user or None."""
+    drf_request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    try:
+        user = drf_request.user
+    except exceptions.AuthenticationFailed:
+        return None
+    return user if user.is_authenticated else None
+
+
+def async_get_view(view):
+    """The async counterpart of @api_view(['GET']) + @permission_classes([IsAuthenticated])."""
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method != 'GET':
+            return json_response({"detail": f'Method "{request.method}" not allowed.'}, status=405)
+        user = await sync_to_async(authenticate_request)(request)
+        if user is None:
+            return json_response({"detail": "Authentication credentials were not provided."}, status=403)
+        return await view(request, user, *args, **kwargs)
+
+    return wrapper
+
+
+# 2- Food list and search (see views.get_food_list)
+@async_get_view
+async def get_food_list(request, user):
+    """Retrieve a list of all available foods, or a ranked page of matches for the search query."""
+
+    search_query = request.GET.get('search', '').strip()
+
+    if search_query:
+        try:
+            limit, offset = parse_search_page(request.GET)
+        except ValueError as exc:
+            return json_response({"error": str(exc)}, status=400)
+
+        foods, next_offset = await asearch_foods(search_query, limit, offset)
+        return json_response(
+            {"foods": FoodSerializer(foods, many=True).data, "next_offset": next_offset}, renderer_class=FastJSONRenderer,
+        )
+
+    catalogue = await sync_to_async(get_cached_catalogue)() or await sync_to_async(get_catalogue)()
+    if catalogue['etag'] in parse_etags(request.headers.get('If-None-Match', '')):
+        return HttpResponse(status=304, headers={'ETag': catalogue['etag']})
+    return json_response(catalogue['data'], headers={'ETag': catalogue['etag']}, renderer_class=FastJSONRenderer)
+
+
+# 4- Meal list (see views.get_meal_list)
+@async_get_view
+async def get_meal_list(request, user):
+    """Retrieve the meals of the authenticated user, newest first, grouped by meal type and paginated by cursor."""
+
+    meals = Meal.objects.filter(user=user)
+
+    try:
+        if request.GET.get('from'):
+            meals = meals.filter(date__gte=parse_date_param(request.GET['from']))
+        if request.GET.get('to'):
+            meals = meals.filter(date__lte=parse_date_param(request.GET['to']))
+    except ValueError:
+        return json_response({"error": "Invalid date format. Use YYYY-MM-DD."}, status=400)
+
+    try:
+        page_size = parse_page_size(request.GET.get('page_size'))
+    except ValueError:
+        return json_response({"error": "page_size must be a positive integer."}, status=400)
+
+    try:
+        meal_groups, next_cursor = await apaginate_meals(meals, page_size, request.GET.get('cursor'))
+    except ValueError:
+        return json_response({"error": "Invalid cursor."}, status=400)
+
+    meal_groups["next_cursor"] = next_cursor
+    return json_response(meal_groups)
+
+
+# 10- Step history (see views.get_step_history)
+@async_get_view
+async def get_step_history(request, user):
+    """Retrieve the step history of the user, or server-side sums per day, week or month."""
+
+    params = request.GET
+    if not any(params.get(name) for name in ('bucket', 'range', 'from', 'to')):
+        encoder = row_encoder(StepHistorySerializer)
+        step_history = StepHistory.objects.filter(user=user).order_by('-date').values_list(*encoder.columns)
+        rows = [row async for row in step_history]
+        return json_response(encoder.encode_rows(rows), renderer_class=FastJSONRenderer)
+
+    try:
+        bucket, start, end = parse_step_window(params, timezone.now().date())
+    except ValueError as exc:
+        return json_response({"error": str(exc)}, status=400)
+
+    return json_response({
+        "bucket": bucket,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        **await abucket_step_history(user, start, end, bucket),
+    }, renderer_class=FastJSONRenderer)
+
+
+# 11- Calorie info (see views.get_calorie_info)
+@async_get_view
+async def get_calorie_info(request, user):
+    """Retrieve the total calories consumed, burned, and remaining calories for the day."""
+
+    # The day's totals and the calorie goal do not depend on each other
+    summary, goal = await asyncio.gather(
+        DailySummary.objects.filter(user=user, date=timezone.now().date())
+        .values_list('calories', 'calories_burned').afirst(),
+        sync_to_async(get_profile_goal)(user),
+    )
+    total_calories_consumed, calories_burned_from_steps = summary or (Decimal('0.0'), Decimal('0.0'))
+    daily_calorie_goal = goal['daily_calorie_goal']
+    remaining_calories = daily_calorie_goal - total_calories_consumed + calories_burned_from_steps
+
+    return json_response({
+        'calorie_goal': str(daily_calorie_goal),
+        'total_calories_consumed': str(total_calories_consumed),
+        'calories_burned_from_steps': str(calories_burned_from_steps),
+        'remaining_calories': str(remaining_calories),
+    })
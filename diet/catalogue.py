@@ -0,0 +1,78 @@
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.renderers import JSONRenderer
+
+from .models import Food
+
+VERSION_KEY = 'diet:catalogue:version'
+
+
+def get_catalogue_cache():
+    return caches[getattr(settings, 'DIET_CATALOGUE_CACHE', 'default')]
+
+
+def get_catalogue_timeout():
+    return getattr(settings, 'DIET_CATALOGUE_CACHE_TIMEOUT', 300)
+
+
+def get_catalogue_version():
+    """
+    Current catalogue version token, created on first use.
+
+    The token expires with the catalogue entry, so a process whose cache does not
+    see another process's bump (the default per-process LocMemCache, e.g. after
+    import_food_data) rebuilds the catalogue and the search index within
+    DIET_CATALOGUE_CACHE_TIMEOUT seconds.
+    """
+    cache = get_catalogue_cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, uuid.uuid4().hex, get_catalogue_timeout())
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_catalogue_version():
+    """Invalidate every cached catalogue response; called whenever the Food table changes."""
+    version = uuid.uuid4().hex
+    get_catalogue_cache().set(VERSION_KEY, version, get_catalogue_timeout())
+    return version
+
+
+def compute_etag(payload):
+    """Strong ETag over the rendered JSON body."""
+    return '"{}"'.format(hashlib.sha256(JSONRenderer().render(payload)).hexdigest())
+
+
+def get_cached_catalogue(version=None):
+    """Return the cached catalogue entry for ``version`` (or the current one) without building it."""
+    version = version or get_catalogue_version()
+    return get_catalogue_cache().get(f'diet:catalogue:{version}')
+
+
+def get_catalogue():
+    """
+    Return ``{'etag': ..., 'data': ...}`` for the full food catalogue, serializing
+    the Food table only when the current version is not cached yet.
+    """
+    from .encoders import row_encoder
+    from .serializers import FoodSerializer
+
+    version = get_catalogue_version()
+    entry = get_cached_catalogue(version)
+    if entry is None:
+        data = {"foods": row_encoder(FoodSerializer).encode_queryset(Food.objects.all())}
+        entry = {'etag': compute_etag(data), 'data': data}
+        get_catalogue_cache().set(f'diet:catalogue:{version}', entry, get_catalogue_timeout())
+    return entry
+
+
+@receiver(post_save, sender=Food)
+@receiver(post_delete, sender=Food)
+def food_changed(sender, **kwargs):
+    bump_catalogue_version()
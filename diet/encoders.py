@@ -0,0 +1,127 @@
+"""
+Serializer-free encoding for the high-volume list responses.
+
+A RowEncoder compiles the field list of a ModelSerializer into one function
+mapping a ``values_list()`` row to the dict the serializer would have built,
+skipping the per-object field graph. FastJSONRenderer renders through orjson
+when it is installed. The serializers themselves stay the source of truth
+for validation and the swagger schema.
+"""
+import datetime
+import time
+from functools import lru_cache
+
+from rest_framework import ISO_8601, serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from .instrumentation import current_metrics
+from .serializers import NutrientField
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib encoder
+    orjson = None
+
+
+class RowEncoder:
+    """
+    Encode ``values_list()`` rows exactly like ``serializer_class(many=True).data``.
+
+    Only fields backed by a single model field are supported. Conversions that
+    are no-ops on database values (integers, strings, primary keys) are left
+    out of the compiled function; NutrientField values always come back from
+    the database with ``decimal_places`` places, so they only need str().
+    """
+
+    def __init__(self, serializer_class):
+        serializer = serializer_class()
+        model = serializer.Meta.model
+        self.columns = []
+        namespace = {}
+        items = []
+        for index, (name, field) in enumerate(serializer.fields.items()):
+            if field.write_only:
+                continue
+            if '.' in field.source or field.source == '*':
+                raise ValueError(f'{serializer_class.__name__}.{name} is not backed by a single model field.')
+            model_field = model._meta.get_field(field.source)
+            value = f'row[{len(self.columns)}]'
+            self.columns.append(field.source)
+
+            converter = self.converter_for(field)
+            if converter is not None:
+                namespace[f'convert_{index}'] = converter
+                expression = f'convert_{index}({value})'
+                if model_field.null:
+                    expression = f'None if {value} is None else {expression}'
+                value = expression
+            items.append(f'{name!r}: {value}')
+
+        source = f'def encode(row):\n    return {{{", ".join(items)}}}\n'
+        exec(compile(source, f'<RowEncoder {serializer_class.__name__}>', 'exec'), namespace)
+        self.encode = namespace['encode']
+
+    @staticmethod
+    def converter_for(field):
+        """The callable turning a database value into the field's representation, or None if it is the value itself."""
+        if isinstance(field, NutrientField):
+            coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+            if coerce_to_string and not field.localize and not field.normalize_output:
+                return str
+        elif isinstance(field, (serializers.IntegerField, serializers.CharField)):
+            return None
+        elif isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is None:
+            return None
+        elif isinstance(field, serializers.DateField):
+            output_format = getattr(field, 'format', api_settings.DATE_FORMAT)
+            if output_format is None:
+                return None
+            if output_format.lower() == ISO_8601:
+                return datetime.date.isoformat
+        return field.to_representation
+
+    def encode_rows(self, rows):
+        metrics = current_metrics()
+        if metrics is None:
+            return list(map(self.encode, rows))
+        started = time.perf_counter()
+        try:
+            return list(map(self.encode, rows))
+        finally:
+            metrics.serializer_time += time.perf_counter() - started
+
+    def encode_queryset(self, queryset):
+        return self.encode_rows(list(queryset.values_list(*self.columns)))
+
+
+@lru_cache(maxsize=None)
+def row_encoder(serializer_class):
+    """The compiled RowEncoder of ``serializer_class``, built on first use."""
+    return RowEncoder(serializer_class)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer rendering through orjson when it is installed.
+
+    Produces the same bytes as JSONRenderer for payloads of strings, integers,
+    None, lists and dicts, which is what the row encoders emit. Anything
+    orjson does not encode the same way (Decimals, datetimes, an ``indent``
+    in the Accept header, UNICODE_JSON disabled) goes through JSONRenderer.
+    Floats can differ in exponent spelling and NaN handling, so only use it
+    on responses without them.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.ensure_ascii or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=self.unsupported, option=orjson.OPT_PASSTHROUGH_DATETIME)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Same escaping of the two line terminators JSON allows but JavaScript does not
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+    @staticmethod
+    def unsupported(obj):
+        raise TypeError
@@ -0,0 +1,146 @@
+"""
+Streaming export of a user's diet history as NDJSON or CSV.
+
+Meals and step records are read with ``.iterator(chunk_size=...)`` and written
+out a chunk at a time, so memory stays flat however many years are exported.
+"""
+import csv
+
+from django.conf import settings
+from rest_framework.negotiation import DefaultContentNegotiation
+from accounts.models import Profile
+from .encoders import FastJSONRenderer
+from .models import Meal, StepHistory
+
+EXPORT_FORMATS = ('ndjson', 'csv')
+
+MEAL_EXPORT_FIELDS = [
+    'date', 'time', 'meal_type', 'food_name', 'portion_size', 'calories', 'fat', 'carbohydrates', 'protein', 'sugars',
+]
+STEP_EXPORT_FIELDS = ['date', 'steps', 'calories_burned']
+CSV_EXPORT_FIELDS = ['type', *MEAL_EXPORT_FIELDS, *STEP_EXPORT_FIELDS[1:]]
+
+# Spreadsheet programs evaluate cells starting with these as formulas
+CSV_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def get_export_chunk_size():
+    return getattr(settings, 'DIET_EXPORT_CHUNK_SIZE', 2000)
+
+
+def export_querysets(user, start=None, end=None):
+    """
+    The meal and step querysets of ``user``, oldest first, projected to the export
+    columns. Bound to a database now, while the replica router can still see
+    whether the user has to read their own writes; they are read while streaming.
+    """
+    meals = Meal.objects.filter(user=user)
+    steps = StepHistory.objects.filter(user=user)
+    if start:
+        meals, steps = meals.filter(date__gte=start), steps.filter(date__gte=start)
+    if end:
+        meals, steps = meals.filter(date__lte=end), steps.filter(date__lte=end)
+
+    meals = meals.order_by('date', 'time', 'meal_id').values_list(
+        'date', 'time', 'meal_type', 'food_name__name', 'portion_size',
+        'calories', 'fat', 'carbohydrates', 'protein', 'sugars',
+    )
+    steps = steps.order_by('date').values_list('date', 'steps', 'calories_burned')
+    return meals.using(meals.db), steps.using(steps.db)
+
+
+def meal_record(row):
+    date, time, meal_type, food_name, *nutrients = row
+    return [date.isoformat(), time.isoformat(), meal_type, food_name, *map(str, nutrients)]
+
+
+def step_record(row):
+    date, steps, calories_burned = row
+    return [date.isoformat(), steps, str(calories_burned)]
+
+
+def export_records(meals, steps):
+    """Yield ``(type, values)`` for every meal, then every step record."""
+    chunk_size = get_export_chunk_size()
+    for row in meals.iterator(chunk_size=chunk_size):
+        yield 'meal', meal_record(row)
+    for row in steps.iterator(chunk_size=chunk_size):
+        yield 'step', step_record(row)
+
+
+def buffered(lines):
+    """Join the encoded lines into one bytes chunk per DIET_EXPORT_CHUNK_SIZE lines."""
+    chunk_size = get_export_chunk_size()
+    buffer = []
+    for line in lines:
+        buffer.append(line)
+        if len(buffer) >= chunk_size:
+            yield b''.join(buffer)
+            buffer = []
+    if buffer:
+        yield b''.join(buffer)
+
+
+def profile_header(user):
+    """First NDJSON line: whose history this is, with the diabetes type and therapy a clinician needs."""
+    profile = Profile.objects.filter(user=user).values_list('diabetes_type', 'therapy').first()
+    diabetes_type, therapy = profile or (None, None)
+    return {'type': 'user', 'username': user.username, 'diabetes_type': diabetes_type, 'therapy': therapy}
+
+
+def stream_ndjson(user, meals, steps):
+    """One JSON object per line: the user header, then meals and steps."""
+    render = FastJSONRenderer().render
+    fields = {'meal': ['type', *MEAL_EXPORT_FIELDS], 'step': ['type', *STEP_EXPORT_FIELDS]}
+
+    def lines():
+        yield render(profile_header(user)) + b'\n'
+        for record_type, values in export_records(meals, steps):
+            yield render(dict(zip(fields[record_type], [record_type, *values]))) + b'\n'
+
+    return buffered(lines())
+
+
+class Echo:
+    """File-like object handing back what csv.writer writes, so each row can be yielded."""
+
+    def write(self, value):
+        return value
+
+
+def csv_safe(value):
+    if isinstance(value, str) and value.startswith(CSV_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def stream_csv(meals, steps):
+    """One table for both record types; the columns of the other type are left empty."""
+    writer = csv.writer(Echo())
+    meal_padding = [''] * (len(STEP_EXPORT_FIELDS) - 1)
+    step_padding = [''] * (len(MEAL_EXPORT_FIELDS) - 1)
+
+    def lines():
+        yield writer.writerow(CSV_EXPORT_FIELDS).encode()
+        for record_type, values in export_records(meals, steps):
+            if record_type == 'meal':
+                values[2:4] = map(csv_safe, values[2:4])  # meal_type, food_name
+                row = [record_type, *values, *meal_padding]
+            else:
+                date, *step_values = values
+                row = [record_type, date, *step_padding, *step_values]
+            yield writer.writerow(row).encode()
+
+    return buffered(lines())
+
+
+class ExportContentNegotiation(DefaultContentNegotiation):
+    """
+    ``?format=`` names the export format here, not a renderer, so DRF must not
+    answer 404 for formats it has no renderer for. The export is streamed and
+    only errors go through a renderer; they are always rendered with the first.
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        renderer = renderers[0]
+        return renderer, renderer.media_type
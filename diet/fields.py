@@ -0,0 +1,44 @@
+from decimal import Decimal
+
+from django.db import models
+
+from .fixedpoint import from_units, to_units
+
+
+class NutrientField(models.DecimalField):
+    """
+    Decimal model field stored as a scaled integer column.
+
+    The value is kept as a BIGINT count of 10**-decimal_places units, so a
+    calorie value with two decimal places is stored in centi-kcal. Python code
+    keeps seeing exact Decimals, while the database compares, adds and SUMs
+    plain integers.
+
+    Sum() and arithmetic on these columns resolve to this field and are scaled
+    back on the way out. Avg() resolves to a plain DecimalField, so pass
+    ``output_field=NutrientField(...)`` to it explicitly.
+    """
+
+    def get_internal_type(self):
+        return "BigIntegerField"
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if hasattr(value, "as_sql"):
+            return value
+        if not prepared:
+            value = self.get_prep_value(value)
+        if value is None:
+            return None
+        # Lookups pass the value through get_prep_value() first, so always scale here
+        return to_units(value, self.decimal_places)
+
+    def get_db_prep_save(self, value, connection):
+        return self.get_db_prep_value(value, connection, prepared=False)
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        if isinstance(value, int):
+            return from_units(value, self.decimal_places)
+        # Non-integer aggregates such as AVG()
+        return Decimal(str(value)).scaleb(-self.decimal_places)
@@ -0,0 +1,26 @@
+from decimal import ROUND_HALF_EVEN, Decimal
+
+
+def to_units(value, decimal_places=2):
+    """
+    Convert a Decimal, int, str or float amount into an integer count of
+    10**-decimal_places units (e.g. 12.34 kcal -> 1234 centi-kcal), rounding half to even.
+    """
+    if isinstance(value, int):
+        return value * 10 ** decimal_places
+    if isinstance(value, float):
+        value = repr(value)
+    return int(Decimal(value).scaleb(decimal_places).to_integral_value(rounding=ROUND_HALF_EVEN))
+
+
+def from_units(units, decimal_places=2):
+    """Convert an integer unit count back into a Decimal with exactly ``decimal_places`` places."""
+    return Decimal(units).scaleb(-decimal_places)
+
+
+def divide_half_even(numerator, denominator):
+    """Integer division of non-negative ints rounding half to even, like DecimalField quantizing on save."""
+    quotient, remainder = divmod(numerator, denominator)
+    if remainder * 2 > denominator or (remainder * 2 == denominator and quotient % 2):
+        quotient += 1
+    return quotient
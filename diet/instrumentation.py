@@ -0,0 +1,213 @@
+import hmac
+import json
+import logging
+import math
+import threading
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+logger = logging.getLogger(__name__)
+
+_current_metrics = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Counters for one request; also the execute_wrapper timing every SQL query it runs."""
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.serializer_time = 0.0
+        self.view_started = None
+        self.view_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.sql_time += time.perf_counter() - started
+
+
+def current_metrics():
+    """The RequestMetrics of the request being handled, or None outside the middleware."""
+    return _current_metrics.get()
+
+
+class TimedSerializerMixin:
+    """DRF serializer mixin adding the time spent in to_representation() to the request metrics."""
+
+    def to_representation(self, instance):
+        metrics = _current_metrics.get()
+        if metrics is None:
+            return super().to_representation(instance)
+        started = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            metrics.serializer_time += time.perf_counter() - started
+
+
+class Histogram:
+    """Cumulative Prometheus histogram with one series per route name."""
+
+    def __init__(self, name, documentation, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, route, value):
+        with self._lock:
+            series = self._series.get(route)
+            if series is None:
+                series = self._series[route] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for index, upper_bound in enumerate(self.buckets):
+                if value <= upper_bound:
+                    series['buckets'][index] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {route: dict(values, buckets=list(values['buckets'])) for route, values in self._series.items()}
+        for route, values in sorted(series.items()):
+            label = f'route="{escape_label(route)}"'
+            for upper_bound, count in zip(self.buckets, values['buckets']):
+                bound = '+Inf' if upper_bound == math.inf else repr(float(upper_bound))
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {count}')
+            lines.append(f'{self.name}_sum{{{label}}} {values["sum"]!r}')
+            lines.append(f'{self.name}_count{{{label}}} {values["count"]}')
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._series = {}
+
+
+def escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+request_duration = Histogram(
+    'request_duration_seconds', 'Time spent handling the request, by route name.', LATENCY_BUCKETS)
+view_duration = Histogram(
+    'request_view_duration_seconds', 'Time spent in the view, by route name.', LATENCY_BUCKETS)
+sql_duration = Histogram(
+    'request_sql_duration_seconds', 'Time spent running SQL per request, by route name.', LATENCY_BUCKETS)
+serializer_duration = Histogram(
+    'request_serializer_duration_seconds', 'Time spent in serializers per request, by route name.', LATENCY_BUCKETS)
+query_count = Histogram(
+    'request_queries', 'SQL queries per request, by route name.', (1, 2, 5, 10, 20, 50, 100, 200, 500))
+response_size = Histogram(
+    'response_size_bytes', 'Response body size, by route name.', (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304))
+
+HISTOGRAMS = [request_duration, view_duration, sql_duration, serializer_duration, query_count, response_size]
+
+
+def render_metrics():
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines += histogram.render()
+    return '\n'.join(lines) + '\n'
+
+
+class RequestMetricsMiddleware:
+    """
+    Record per-request query count, SQL time, view time, serializer time and
+    response size. They are sent back as a Server-Timing header, logged as one
+    JSON line on the ``diet.instrumentation`` logger and aggregated into the
+    per-route histograms served by ``metrics_view``.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, 'REQUEST_METRICS_ENABLED', True):
+            return self.get_response(request)
+
+        metrics = RequestMetrics()
+        token = _current_metrics.set(metrics)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics))
+                response = self.get_response(request)
+        finally:
+            _current_metrics.reset(token)
+        finished = time.perf_counter()
+        if metrics.view_started is not None:
+            metrics.view_time = finished - metrics.view_started
+
+        self.record(request, response, metrics, finished - started)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = _current_metrics.get()
+        if metrics is not None:
+            metrics.view_started = time.perf_counter()
+
+    def record(self, request, response, metrics, duration):
+        match = request.resolver_match
+        route = match.view_name if match is not None else 'unmatched'
+        size = None if response.streaming else len(response.content)
+
+        request_duration.observe(route, duration)
+        view_duration.observe(route, metrics.view_time)
+        sql_duration.observe(route, metrics.sql_time)
+        serializer_duration.observe(route, metrics.serializer_time)
+        query_count.observe(route, metrics.queries)
+        if size is not None:
+            response_size.observe(route, size)
+
+        if getattr(settings, 'REQUEST_METRICS_SERVER_TIMING', True):
+            timings = [
+                f'db;dur={metrics.sql_time * 1000:.2f};desc="{metrics.queries} queries"',
+                f'serializer;dur={metrics.serializer_time * 1000:.2f}',
+                f'view;dur={metrics.view_time * 1000:.2f}',
+                f'total;dur={duration * 1000:.2f}',
+            ]
+            if response.has_header('Server-Timing'):
+                timings.insert(0, response['Server-Timing'])
+            response['Server-Timing'] = ', '.join(timings)
+
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({
+                'method': request.method,
+                'path': request.path,
+                'route': route,
+                'status': response.status_code,
+                'duration_ms': round(duration * 1000, 2),
+                'view_ms': round(metrics.view_time * 1000, 2),
+                'sql_ms': round(metrics.sql_time * 1000, 2),
+                'queries': metrics.queries,
+                'serializer_ms': round(metrics.serializer_time * 1000, 2),
+                'response_bytes': size,
+            }))
+
+
+def metrics_view(request):
+    """
+    Prometheus text exposition of the request histograms of this process.
+    Requires ``Authorization: Bearer <REQUEST_METRICS_TOKEN>`` when a token is
+    configured, a staff session otherwise.
+    """
+    token = getattr(settings, 'REQUEST_METRICS_TOKEN', '')
+    if token:
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return HttpResponseForbidden()
+    elif not request.user.is_staff:
+        return HttpResponseForbidden()
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
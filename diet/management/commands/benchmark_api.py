@@ -0,0 +1,381 @@
+import datetime
+import json
+import logging
+import os
+import random
+import statistics
+import time
+import tracemalloc
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext, setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+from accounts.cache import get_profile_cache
+from diet import urls as diet_urls
+from diet.catalogue import get_catalogue_cache
+from diet.models import CALORIES_PER_STEP, Food, Meal, StepHistory
+from diet.summary import rebuild_daily_summaries
+
+MEAL_TYPES = ['breakfast', 'lunch', 'dinner', 'snack']
+# Metrics compared against the baseline. Query counts do not change between runs
+# of the same tree and must never grow. Response sizes and allocations barely do
+# (a one-year range covers 53 or 54 weeks depending on the day) and may grow by
+# --threshold. Wall-clock latencies depend on the machine and its load, so they
+# are only compared with --latency-gate. p99 is reported but never compared,
+# with the default 30 iterations it is the single slowest request.
+COUNT_METRICS = ['queries']
+SIZE_METRICS = ['response_bytes', 'peak_kb']
+LATENCY_METRICS = ['p50_ms', 'p95_ms']
+PERCENTILES = {'p50_ms': 0.50, 'p95_ms': 0.95, 'p99_ms': 0.99}
+
+
+def get_default_baseline_path():
+    return os.path.join(settings.BASE_DIR, 'diet/benchmarks', 'baseline.json')
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    index = max(0, min(len(sorted_values) - 1, round(fraction * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a synthetic dataset in a throwaway test database, drive every diet route through the '
+        'test client and report latency percentiles, query counts and allocated memory per endpoint, '
+        'failing on regressions against a baseline JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=5, help='Number of users to seed.')
+        parser.add_argument('--foods', type=int, default=500, help='Number of foods in the catalogue.')
+        parser.add_argument('--years', type=float, default=1, help='Years of meal and step history per user.')
+        parser.add_argument('--meals-per-day', type=int, default=4, help='Meals logged per user and day.')
+        parser.add_argument('--iterations', type=int, default=30, help='Timed requests per endpoint and round.')
+        parser.add_argument('--rounds', type=int, default=1,
+                            help='Rounds of timed requests per endpoint; latencies are the median over the rounds.')
+        parser.add_argument('--warmup', type=int, default=3, help='Untimed requests per endpoint before measuring.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the synthetic data.')
+        parser.add_argument('--baseline', help='Baseline JSON (defaults to diet/benchmarks/baseline.json).')
+        parser.add_argument('--write-baseline', action='store_true', help='Store this run as the new baseline.')
+        parser.add_argument('--latency-gate', action='store_true',
+                            help='Also fail on latency regressions. Only meaningful against a baseline recorded '
+                                 'on the same machine; use several --rounds.')
+        parser.add_argument('--threshold', type=float, default=0.25,
+                            help='Allowed relative increase of latency, response size and memory over the baseline.')
+        parser.add_argument('--min-delta-ms', type=float, default=2.0,
+                            help='Latency increases smaller than this are treated as noise.')
+        parser.add_argument('--output', help='Also write the results of this run to this JSON file.')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        # Keep the per-request instrumentation log lines out of the report
+        logging.disable(logging.INFO)
+        # Never benchmark against the real database: migrate a fresh test database
+        # instead (replicas become test mirrors of it)
+        old_config = setup_databases(verbosity=0, interactive=False, serialized_aliases=[])
+        try:
+            get_catalogue_cache().clear()
+            get_profile_cache().clear()
+            started = time.perf_counter()
+            context = self.seed(options)
+            self.stdout.write(
+                f"Seeded {options['users']} users, {options['foods']} foods, {context['meals']} meals and "
+                f"{context['steps']} step days in {time.perf_counter() - started:.1f}s"
+            )
+            results = self.run_scenarios(context, options)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+            logging.disable(logging.NOTSET)
+
+        self.report(results)
+        if options['output']:
+            self.write_json(options['output'], results)
+
+        baseline_path = options['baseline'] or get_default_baseline_path()
+        if options['write_baseline']:
+            self.write_json(baseline_path, results)
+            self.stdout.write(self.style.SUCCESS(f'Baseline written to {baseline_path}'))
+            return
+        if not os.path.exists(baseline_path):
+            self.stdout.write(self.style.WARNING(f'No baseline at {baseline_path}; run with --write-baseline to create one.'))
+            return
+
+        with open(baseline_path, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = self.compare(
+            results, baseline, options['threshold'], options['min_delta_ms'], options['latency_gate'],
+        )
+        if regressions:
+            for line in regressions:
+                self.stdout.write(self.style.ERROR(line))
+            raise CommandError(f'{len(regressions)} performance regressions against {baseline_path}')
+        self.stdout.write(self.style.SUCCESS('No performance regressions against the baseline'))
+
+    # Synthetic data
+
+    def seed(self, options):
+        rng = random.Random(options['seed'])
+        today = datetime.date.today()
+        days = max(int(options['years'] * 365), 1)
+
+        foods = Food.objects.bulk_create([
+            Food(
+                name=f'Food {index:05d}',
+                calories=Decimal(rng.randint(0, 90000)).scaleb(-2),
+                fat=Decimal(rng.randint(0, 5000)).scaleb(-2),
+                carbohydrates=Decimal(rng.randint(0, 8000)).scaleb(-2),
+                protein=Decimal(rng.randint(0, 4000)).scaleb(-2),
+                sugars=Decimal(rng.randint(0, 5000)).scaleb(-2),
+            )
+            for index in range(max(options['foods'], 1))
+        ])
+
+        users = []
+        meal_count = step_count = 0
+        for index in range(max(options['users'], 1)):
+            user = User.objects.create_user(username=f'bench{index}', password='bench')
+            users.append(user)
+
+            meals = []
+            step_records = []
+            for offset in range(days):
+                date = today - datetime.timedelta(days=offset)
+                for slot in range(options['meals_per_day']):
+                    meal = Meal(
+                        user=user,
+                        food_name=rng.choice(foods),
+                        meal_type=MEAL_TYPES[slot % len(MEAL_TYPES)],
+                        portion_size=Decimal(rng.randint(50, 400)),
+                        date=date,
+                        time=datetime.time((7 + slot * 4) % 24, rng.randint(0, 59)),
+                    )
+                    meal.calculate_nutrition()
+                    meals.append(meal)
+                steps = rng.randint(0, 20000)
+                step_records.append(StepHistory(
+                    user=user, steps=steps, calories_burned=steps * CALORIES_PER_STEP, date=date,
+                ))
+
+            # bulk_create sends no signals, so the daily summaries are rebuilt by hand
+            Meal.objects.bulk_create(meals, batch_size=1000)
+            StepHistory.objects.bulk_create(step_records, batch_size=1000)
+            dates = [today - datetime.timedelta(days=offset) for offset in range(days)]
+            for start in range(0, len(dates), 100):
+                rebuild_daily_summaries({(user.pk, date) for date in dates[start:start + 100]})
+            meal_count += len(meals)
+            step_count += len(step_records)
+
+        return {
+            'rng': rng,
+            'today': today,
+            'user': users[0],
+            'foods': foods,
+            'meals': meal_count,
+            'steps': step_count,
+        }
+
+    # Scenarios
+
+    def get_scenarios(self, context):
+        """
+        Route name -> list of (label, build) pairs. ``build`` is called before every
+        request (outside the timed section) and returns ``(method, path, data, expected statuses)``.
+        """
+        user, foods, rng, today = context['user'], context['foods'], context['rng'], context['today']
+
+        def new_meal():
+            return Meal.objects.create(user=user, food_name=rng.choice(foods), portion_size=Decimal('100'))
+
+        def meal_id():
+            return Meal.objects.filter(user=user).values_list('meal_id', flat=True).order_by('-date').first()
+
+        def search_term():
+            # 'Food 001' matches the 100 foods 'Food 00100' to 'Food 00199' (fewer with a smaller --foods)
+            return f'Food {rng.randrange(max(len(foods) // 100, 1)):03d}'
+
+        def food_payload():
+            return {'food_name': rng.choice(foods).name, 'meal_type': 'lunch', 'portion_size': rng.randint(50, 400)}
+
+        return {
+            'list_food_types': [
+                ('', lambda: ('get', '/diet/food_types/', None, {200})),
+            ],
+            'food_list': [
+                ('catalogue', lambda: ('get', '/diet/food/', None, {200})),
+                ('search', lambda: ('get', '/diet/food/', {'search': search_term()}, {200})),
+                ('search page 3', lambda: ('get', '/diet/food/', {'search': search_term(), 'offset': 40}, {200})),
+            ],
+            'create_meal': [
+                ('', lambda: ('post', '/diet/create/', food_payload(), {201})),
+            ],
+            'create_meal_batch': [
+                ('10 items', lambda: ('post', '/diet/create/batch/', {'items': [food_payload() for _ in range(10)]}, {201})),
+            ],
+            'meal_list': [
+                ('first page', lambda: ('get', '/diet/', None, {200})),
+                ('one month', lambda: ('get', '/diet/', {
+                    'from': (today - datetime.timedelta(days=30)).isoformat(), 'to': today.isoformat(), 'page_size': 200,
+                }, {200})),
+            ],
+            'meal_detail': [
+                ('', lambda: ('get', f'/diet/{meal_id()}/', None, {200})),
+            ],
+            'update_meal': [
+                ('', lambda: ('put', f'/diet/{meal_id()}/update/', food_payload(), {200})),
+            ],
+            'meal_delete': [
+                ('', lambda: ('delete', f'/diet/{new_meal().meal_id}/delete/', None, {204})),
+            ],
+            'get_calorie_info': [
+                ('', lambda: ('get', '/diet/calorie-info/', None, {200})),
+            ],
+            'get_daily_totals': [
+                ('', lambda: ('get', '/diet/daily-totals/', {'date': today.isoformat()}, {200})),
+            ],
+            'record_steps': [
+                ('', lambda: ('post', '/diet/record_steps/', {'steps': rng.randint(1, 500)}, {201, 202})),
+            ],
+            'record_steps_batch': [
+                ('50 samples', lambda: ('post', '/diet/record_steps/batch/', {'samples': [
+                    {'steps': rng.randint(1, 500)} for _ in range(50)
+                ]}, {201, 202})),
+            ],
+            'get_step_history': [
+                ('full history', lambda: ('get', '/diet/step_history/', None, {200})),
+                ('weekly buckets', lambda: ('get', '/diet/step_history/', {'bucket': 'week', 'range': '1y'}, {200})),
+            ],
+            'export_history': [
+                ('ndjson', lambda: ('get', '/diet/export/', {'format': 'ndjson'}, {200})),
+                ('csv', lambda: ('get', '/diet/export/', {'format': 'csv'}, {200})),
+            ],
+            'async_food_list': [
+                ('catalogue', lambda: ('get', '/diet/async/food/', None, {200})),
+                ('search', lambda: ('get', '/diet/async/food/', {'search': search_term()}, {200})),
+            ],
+            'async_meal_list': [
+                ('first page', lambda: ('get', '/diet/async/', None, {200})),
+            ],
+            'async_get_calorie_info': [
+                ('', lambda: ('get', '/diet/async/calorie-info/', None, {200})),
+            ],
+            'async_get_step_history': [
+                ('full history', lambda: ('get', '/diet/async/step_history/', None, {200})),
+                ('weekly buckets', lambda: ('get', '/diet/async/step_history/', {'bucket': 'week', 'range': '1y'}, {200})),
+            ],
+        }
+
+    def run_scenarios(self, context, options):
+        scenarios = self.get_scenarios(context)
+        route_names = [pattern.name for pattern in diet_urls.urlpatterns if pattern.name]
+        missing = [name for name in route_names if name not in scenarios]
+        if missing:
+            raise CommandError(f'No benchmark scenario for diet routes: {", ".join(missing)}')
+
+        client = Client()
+        client.force_login(context['user'])
+        endpoints = {
+            f'{diet_urls.app_name}:{route_name}' + (f' [{label}]' if label else ''): build
+            for route_name in route_names
+            for label, build in scenarios[route_name]
+        }
+        for key, build in endpoints.items():
+            for _ in range(options['warmup']):
+                self.request(client, key, build)
+
+        # Every round times each endpoint in turn, so a slow spell on the machine
+        # lands in one round of several endpoints rather than in every round of one
+        rounds = {key: [] for key in endpoints}
+        for _ in range(max(options['rounds'], 1)):
+            for key, build in endpoints.items():
+                rounds[key].append(self.time_requests(client, key, build, options['iterations']))
+
+        results = {}
+        for key, build in endpoints.items():
+            results[key] = {
+                # The median over the rounds, which one slow round cannot move
+                **{metric: round(statistics.median(timings[metric] for timings in rounds[key]), 3) for metric in PERCENTILES},
+                **self.trace_request(client, key, build),
+            }
+        return results
+
+    def request(self, client, key, build):
+        method, path, data, expected = build()
+        if method == 'get':
+            response = client.get(path, data)
+        else:
+            response = getattr(client, method)(path, data, content_type='application/json')
+        if response.status_code not in expected:
+            raise CommandError(f'{key}: {method.upper()} {path} returned {response.status_code}')
+        # Streamed bodies are produced while they are read, so read them inside the timed section
+        return b''.join(response.streaming_content) if response.streaming else response.content
+
+    def time_requests(self, client, key, build, iterations):
+        """Latency percentiles of ``iterations`` requests."""
+        timings = []
+        for _ in range(max(iterations, 1)):
+            started = time.perf_counter()
+            self.request(client, key, build)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        return {metric: percentile(timings, fraction) for metric, fraction in PERCENTILES.items()}
+
+    def trace_request(self, client, key, build):
+        """Query count, allocations and size of one traced request (tracing skews timings)."""
+        tracemalloc.start()
+        try:
+            with CaptureQueriesContext(connection) as queries:
+                body = self.request(client, key, build)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        return {
+            'queries': len(queries),
+            'peak_kb': round(peak / 1024, 1),
+            'response_bytes': len(body),
+        }
+
+    # Reporting
+
+    def report(self, results):
+        width = max(len(key) for key in results)
+        self.stdout.write(f"{'endpoint':<{width}}  {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>7} {'peak KB':>9} {'bytes':>9}")
+        for key, result in results.items():
+            self.stdout.write(
+                f"{key:<{width}}  {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f} "
+                f"{result['queries']:>7} {result['peak_kb']:>9.1f} {result['response_bytes']:>9}"
+            )
+
+    def compare(self, results, baseline, threshold, min_delta_ms, latency_gate=False):
+        regressions = []
+        for key, result in results.items():
+            previous = baseline.get(key)
+            if previous is None:
+                # An endpoint without a baseline would never be gated
+                regressions.append(f'{key}: missing from the baseline; run with --write-baseline to add it')
+                continue
+            for metric in COUNT_METRICS:
+                if result[metric] > previous[metric]:
+                    regressions.append(f'{key}: {metric} {previous[metric]} -> {result[metric]}')
+            for metric in LATENCY_METRICS if latency_gate else []:
+                if (result[metric] > previous[metric] * (1 + threshold)
+                        and result[metric] - previous[metric] > min_delta_ms):
+                    regressions.append(f'{key}: {metric} {previous[metric]} -> {result[metric]}')
+            for metric in SIZE_METRICS:
+                if result[metric] > previous[metric] * (1 + threshold):
+                    regressions.append(f'{key}: {metric} {previous[metric]} -> {result[metric]}')
+        return regressions
+
+    def write_json(self, path, results):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as output:
+            json.dump(results, output, indent=2, sort_keys=True)
+            output.write('\n')
@@ -0,0 +1,45 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from diet.models import DailySummary, Food, Meal, StepHistory
+from diet.queries import MEAL_KEYSET_ORDER
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN the hot diet queries and fail if any of them does not use its index'
+
+    def get_checks(self):
+        """(description, queryset, index names any of which must appear in the plan)"""
+        today = datetime.date.today()
+        return [
+            ('meal list page', Meal.objects.filter(user_id=1).order_by(*MEAL_KEYSET_ORDER),
+             {'diet_meal_user_date_idx', 'diet_meal_user_date_type_idx'}),
+            ('meals by day', Meal.objects.filter(user_id=1, date=today),
+             {'diet_meal_user_date_idx', 'diet_meal_user_date_type_idx'}),
+            ('meals by day and type', Meal.objects.filter(user_id=1, date=today, meal_type='lunch'),
+             {'diet_meal_user_date_type_idx'}),
+            ('steps by day', StepHistory.objects.filter(user_id=1, date=today),
+             {'diet_step_user_date_unique', 'sqlite_autoindex_diet_stephistory_1'}),
+            ('step history', StepHistory.objects.filter(user_id=1).order_by('-date'),
+             {'diet_step_user_date_unique', 'sqlite_autoindex_diet_stephistory_1'}),
+            ('daily summary', DailySummary.objects.filter(user_id=1, date=today),
+             {'diet_dailysummary_user_date_unique', 'sqlite_autoindex_diet_dailysummary_1'}),
+            ('food by name', Food.objects.by_name('Apple'),
+             {'diet_food_name_ci_unique'}),
+        ]
+
+    def handle(self, *args, **options):
+        failures = []
+        for description, queryset, indexes in self.get_checks():
+            plan = queryset.explain()
+            used = sorted(index for index in indexes if index in plan)
+            if used:
+                self.stdout.write(f'{description}: uses {", ".join(used)}')
+            else:
+                failures.append(description)
+                self.stdout.write(self.style.ERROR(f'{description}: no expected index in plan\n{plan}'))
+
+        if failures:
+            raise CommandError(f'{len(failures)} queries do not use their index on {connection.vendor}: {", ".join(failures)}')
+        self.stdout.write(self.style.SUCCESS('All hot queries use their indexes'))
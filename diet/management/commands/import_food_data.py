@@ -1,45 +1,119 @@
 import csv
+import time
+from contextlib import nullcontext
+from decimal import Decimal
+from itertools import islice
+
 from django.core.management.base import BaseCommand
+from django.db import transaction
 from diet.models import Food
-from decimal import Decimal
-import os
-from django.conf import settings
+from diet.nutrition import NUTRIENT_COLUMNS, get_nutrition_csv_path, parse_row
+from diet.catalogue import bump_catalogue_version
+
+NUTRIENT_FIELDS = list(NUTRIENT_COLUMNS)
+TWO_PLACES = Decimal('0.01')
 
 
 class Command(BaseCommand):
     help = 'Import food data from the nutrition.csv into the Food model'
 
-    def handle(self, *args, **kwargs):
-        data_dir = os.path.join(settings.BASE_DIR, 'diet/data')
-        csv_file_path = os.path.join(data_dir, 'nutrition.csv')
+    def add_arguments(self, parser):
+        parser.add_argument('--file', dest='csv_file', help='CSV file to import (defaults to diet/data/nutrition.csv).')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Number of CSV rows written per transaction.')
+        parser.add_argument('--atomic', action='store_true', help='Run the whole import in a single transaction.')
+        parser.add_argument('--dry-run', action='store_true', help='Print the changes that would be made without writing them.')
 
-        def clean_value(value):
-            if value:
-                try:
-                    return Decimal(value.replace(' g', '').replace(' mg', '').replace('ml', '').strip())
-                except ValueError:
-                    return Decimal('0.0')
-            return Decimal('0.0')
+    def handle(self, *args, **options):
+        csv_file_path = options['csv_file'] or get_nutrition_csv_path()
+        chunk_size = max(options['chunk_size'], 1)
+        dry_run = options['dry_run']
+
+        # Load the current catalogue once: lowercased name -> (pk, nutrient values).
+        # Names are unique case-insensitively, so "apple" in the CSV updates an existing "Apple".
+        existing = {
+            name.lower(): (pk, values)
+            for pk, name, *values in Food.objects.values_list('pk', 'name', *NUTRIENT_FIELDS).iterator()
+        }
+        counts = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+        started = time.perf_counter()
+        total_rows = 0
 
         with open(csv_file_path, mode='r', newline='', encoding='utf-8') as csvfile:
             reader = csv.DictReader(csvfile)
-            for row in reader:
-                # Create or update the food item
-                food, created = Food.objects.get_or_create(
-                    name=row['name'],
-                    defaults={
-                        'calories': clean_value(row['calories']),
-                        'fat': clean_value(row['fat']),
-                        'carbohydrates': clean_value(row['carbohydrate']),
-                        'protein': clean_value(row['protein']),
-                        'portion_size': Decimal('100'),  # Default portion size is 100g
-                    }
+            with transaction.atomic() if options['atomic'] and not dry_run else nullcontext():
+                while True:
+                    chunk = list(islice(reader, chunk_size))
+                    if not chunk:
+                        break
+                    total_rows += len(chunk)
+                    self.import_chunk(chunk, existing, counts, dry_run)
+
+        if not dry_run:
+            # bulk_create/bulk_update send no model signals, so bump the catalogue version by hand
+            bump_catalogue_version()
+
+        elapsed = time.perf_counter() - started
+        rate = total_rows / elapsed if elapsed else total_rows
+        summary = (
+            f"{total_rows} rows in {elapsed:.2f}s ({rate:.0f} rows/s): "
+            f"{counts['inserted']} inserted, {counts['updated']} updated, {counts['unchanged']} unchanged"
+        )
+        if dry_run:
+            self.stdout.write(self.style.WARNING(f'Dry run, nothing written. {summary}'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Successfully imported food data into the Food model. {summary}'))
+
+    def import_chunk(self, chunk, existing, counts, dry_run):
+        """Diff one chunk of CSV rows against the catalogue and write it with bulk queries."""
+        to_create = {}
+        to_update = {}
+
+        for row in chunk:
+            name = row['name']
+            key = name.lower()
+            nutrients = {field: value.quantize(TWO_PLACES) for field, value in parse_row(row).items()}
+            values = [nutrients[field] for field in NUTRIENT_FIELDS]
+
+            if key in to_create:
+                # Repeated name within the chunk: the last row wins, as it did with get_or_create
+                for field, value in nutrients.items():
+                    setattr(to_create[key], field, value)
+                continue
+
+            current = existing.get(key)
+            if current is None:
+                to_create[key] = Food(name=name, portion_size=Decimal('100'), **nutrients)
+                counts['inserted'] += 1
+                if dry_run:
+                    self.stdout.write(f'+ {name}')
+                continue
+
+            pk, old_values = current
+            if list(old_values) == values:
+                counts['unchanged'] += 1
+                continue
+
+            if dry_run:
+                changes = ', '.join(
+                    f'{field}: {old} -> {new}'
+                    for field, old, new in zip(NUTRIENT_FIELDS, old_values, values)
+                    if old != new
                 )
-                if not created:  # If the food already exists, we update it
-                    food.calories = clean_value(row['calories'])
-                    food.fat = clean_value(row['fat'])
-                    food.carbohydrates = clean_value(row['carbohydrate'])
-                    food.protein = clean_value(row['protein'])
-                    food.save()
-
-        self.stdout.write(self.style.SUCCESS('Successfully imported food data into the Food model'))
+                self.stdout.write(f'~ {name} ({changes})')
+            if pk not in to_update:
+                counts['updated'] += 1
+            to_update[pk] = Food(pk=pk, **nutrients)
+            existing[key] = (pk, values)
+
+        if dry_run:
+            for key, food in to_create.items():
+                existing[key] = (None, [getattr(food, field) for field in NUTRIENT_FIELDS])
+            return
+
+        with transaction.atomic():
+            created = Food.objects.bulk_create(to_create.values())
+            if to_update:
+                Food.objects.bulk_update(to_update.values(), NUTRIENT_FIELDS)
+
+        for food in created:
+            existing[food.name.lower()] = (food.pk, [getattr(food, field) for field in NUTRIENT_FIELDS])
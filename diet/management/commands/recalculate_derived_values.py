@@ -0,0 +1,153 @@
+import time
+from decimal import Decimal
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from accounts.cache import get_profile_cache, profile_cache_key
+from accounts.models import ACTIVITY_FACTORS, Profile
+from diet.fixedpoint import from_units, to_units
+from diet.models import CALORIES_PER_STEP, Meal, StepHistory
+from diet.nutrition import NUTRIENT_COLUMNS
+from diet.summary import rebuild_daily_summaries
+
+NUTRIENT_FIELDS = list(NUTRIENT_COLUMNS)
+
+
+def to_cents(values):
+    """NutrientField column -> int64 array of the stored hundredths."""
+    return np.array([to_units(value) for value in values], dtype=np.int64)
+
+
+def from_cents(array):
+    return [from_units(int(value)) for value in array]
+
+
+def divide_half_even(numerator, denominator):
+    """Integer division rounding half to even, which is how DecimalField quantizes on save."""
+    quotient, remainder = np.divmod(numerator, denominator)
+    twice = remainder * 2
+    round_up = (twice > denominator) | ((twice == denominator) & (quotient % 2 == 1))
+    return quotient + round_up
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute the derived meal nutrition, step calories and profile calorie goals in bulk, '
+        'after changing the food catalogue, CALORIES_PER_STEP or the activity factors'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--meals', action='store_true', help='Recompute meal nutrition from the linked foods.')
+        parser.add_argument('--steps', action='store_true', help='Recompute calories burned from steps.')
+        parser.add_argument('--profiles', action='store_true', help='Recompute the profile daily calorie goals.')
+        parser.add_argument('--activity-level', default='sedentary', choices=list(ACTIVITY_FACTORS),
+                            help='Activity level used for the calorie goals.')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Rows read and written per batch.')
+
+    def handle(self, *args, **options):
+        chunk_size = max(options['chunk_size'], 1)
+        run_all = not (options['meals'] or options['steps'] or options['profiles'])
+
+        if run_all or options['meals']:
+            self.run('meals', Meal.objects.all(), 'meal_id', chunk_size, self.recalculate_meals)
+        if run_all or options['steps']:
+            self.run('steps', StepHistory.objects.all(), 'id', chunk_size, self.recalculate_steps)
+        if run_all or options['profiles']:
+            factor = ACTIVITY_FACTORS[options['activity_level']]
+            profiles = Profile.objects.filter(weight__isnull=False, height__isnull=False, age__isnull=False)
+            self.run('profiles', profiles, 'id', chunk_size,
+                     lambda chunk_profiles: self.recalculate_profiles(chunk_profiles, factor))
+
+    def run(self, label, queryset, pk_name, chunk_size, recalculate):
+        """Walk ``queryset`` in primary-key order, one chunk at a time, reporting progress."""
+        started = time.perf_counter()
+        last_pk = None
+        total = changed = 0
+        while True:
+            chunk = queryset.order_by(pk_name)
+            if last_pk is not None:
+                chunk = chunk.filter(**{f'{pk_name}__gt': last_pk})
+            chunk = chunk[:chunk_size]
+
+            with transaction.atomic():
+                rows, updated, last_pk = recalculate(chunk)
+            if not rows:
+                break
+            total += rows
+            changed += updated
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'{label}: {total} rows, {changed} updated ({total / elapsed:.0f} rows/s)')
+
+        self.stdout.write(self.style.SUCCESS(f'{label}: done, {changed} of {total} rows updated'))
+
+    def recalculate_meals(self, meals):
+        rows = list(meals.values_list(
+            'meal_id', 'user_id', 'date', 'portion_size',
+            *NUTRIENT_FIELDS, *(f'food_name__{field}' for field in NUTRIENT_FIELDS),
+        ))
+        if not rows:
+            return 0, 0, None
+
+        columns = list(zip(*rows))
+        count = len(NUTRIENT_FIELDS)
+        portions = to_cents(columns[3])
+        current = np.stack([to_cents(column) for column in columns[4:4 + count]], axis=1)
+        per_100g = np.stack([to_cents(column) for column in columns[4 + count:]], axis=1)
+
+        # cents * centigrams / (100 g * 100) -> cents, for every meal and nutrient at once
+        recalculated = divide_half_even(per_100g * portions[:, None], 10000)
+        changed = np.flatnonzero((recalculated != current).any(axis=1))
+
+        meals_to_update = []
+        for index in changed:
+            meal = Meal(meal_id=columns[0][index], user_id=columns[1][index], date=columns[2][index])
+            for field, value in zip(NUTRIENT_FIELDS, from_cents(recalculated[index])):
+                setattr(meal, field, value)
+            meals_to_update.append(meal)
+
+        Meal.objects.bulk_update(meals_to_update, NUTRIENT_FIELDS)
+        rebuild_daily_summaries({(meal.user_id, meal.date) for meal in meals_to_update})
+        return len(rows), len(meals_to_update), columns[0][-1]
+
+    def recalculate_steps(self, step_records):
+        rows = list(step_records.values_list('id', 'user_id', 'date', 'steps', 'calories_burned'))
+        if not rows:
+            return 0, 0, None
+
+        ids, user_ids, dates, steps, burned = zip(*rows)
+        # CALORIES_PER_STEP in ten-thousandths, so the product divides back down to cents
+        coefficient = to_units(CALORIES_PER_STEP, 4)
+        recalculated = divide_half_even(np.array(steps, dtype=np.int64) * coefficient, 100)
+        changed = np.flatnonzero(recalculated != to_cents(burned))
+
+        records = [
+            StepHistory(id=ids[index], calories_burned=from_units(int(recalculated[index])))
+            for index in changed
+        ]
+        StepHistory.objects.bulk_update(records, ['calories_burned'])
+        rebuild_daily_summaries({(user_ids[index], dates[index]) for index in changed})
+        return len(rows), len(records), ids[-1]
+
+    def recalculate_profiles(self, profiles, activity_factor):
+        rows = list(profiles.values_list('id', 'user_id', 'gender', 'weight', 'height', 'age', 'daily_calorie_goal'))
+        if not rows:
+            return 0, 0, None
+
+        ids, user_ids, genders, weights, heights, ages, goals = zip(*rows)
+        # Same float arithmetic, in the same order, as Profile.calculate_bmr
+        offset = np.where(np.array(genders) == 'male', 5, -161)
+        bmr = 10 * np.array(weights, dtype=float) + 6.25 * np.array(heights, dtype=float) - 5 * np.array(ages, dtype=float) + offset
+        recalculated = [
+            Decimal(float(goal)).quantize(Decimal('0.01'))
+            for goal in bmr * activity_factor
+        ]
+        changed = [index for index, goal in enumerate(recalculated) if goal != goals[index]]
+
+        Profile.objects.bulk_update(
+            [Profile(id=ids[index], daily_calorie_goal=recalculated[index]) for index in changed],
+            ['daily_calorie_goal'],
+        )
+        # bulk_update sends no post_save, so drop the cached goals by hand
+        get_profile_cache().delete_many([profile_cache_key(user_ids[index]) for index in changed])
+        return len(rows), len(changed), ids[-1]
@@ -0,0 +1,40 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = (
+        'Stand-in replicator for local testing of the read replicas: copy the primary SQLite '
+        'database into every DATABASE_REPLICAS file with the SQLite online backup API'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds between two copies.')
+        parser.add_argument('--once', action='store_true', help='Copy once and exit.')
+
+    def handle(self, *args, **options):
+        aliases = getattr(settings, 'DATABASE_REPLICA_ALIASES', [])
+        if not aliases:
+            raise CommandError('No replicas configured; set DATABASE_REPLICAS to a comma-separated list of SQLite files.')
+        primary = connections[DEFAULT_DB_ALIAS]
+        if primary.vendor != 'sqlite' or any(connections[alias].vendor != 'sqlite' for alias in aliases):
+            raise CommandError('replicate_sqlite only copies SQLite databases.')
+
+        while True:
+            started = time.perf_counter()
+            self.replicate(primary, aliases)
+            self.stdout.write(f'Copied the primary into {len(aliases)} replicas in {time.perf_counter() - started:.3f}s')
+            if options['once']:
+                return
+            time.sleep(options['interval'])
+
+    def replicate(self, primary, aliases):
+        primary.ensure_connection()
+        for alias in aliases:
+            replica = connections[alias]
+            replica.ensure_connection()
+            # A consistent snapshot of the primary, even while it is being written to
+            primary.connection.backup(replica.connection)
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.16 on 2026-10-18 11:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("diet", "0008_stephistory"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="food",
+            name="sugars",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=6),
+        ),
+    ]
@@ -0,0 +1,103 @@
+# Generated by Django 4.2.16 on 2026-10-18 11:11
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from decimal import Decimal
+
+CALORIES_PER_STEP = Decimal("0.04")
+MEAL_TOTAL_FIELDS = ("calories", "fat", "carbohydrates", "protein", "sugars")
+
+
+def backfill_daily_summaries(apps, schema_editor):
+    Meal = apps.get_model("diet", "Meal")
+    StepHistory = apps.get_model("diet", "StepHistory")
+    DailySummary = apps.get_model("diet", "DailySummary")
+
+    summaries = {}
+    meal_totals = Meal.objects.values("user_id", "date").annotate(
+        **{field: models.Sum(field) for field in MEAL_TOTAL_FIELDS}
+    )
+    for row in meal_totals.iterator():
+        summary = summaries.setdefault(
+            (row["user_id"], row["date"]),
+            DailySummary(user_id=row["user_id"], date=row["date"]),
+        )
+        for field in MEAL_TOTAL_FIELDS:
+            setattr(summary, field, row[field] or 0)
+
+    step_totals = StepHistory.objects.values("user_id", "date").annotate(
+        total_steps=models.Sum("steps")
+    )
+    for row in step_totals.iterator():
+        summary = summaries.setdefault(
+            (row["user_id"], row["date"]),
+            DailySummary(user_id=row["user_id"], date=row["date"]),
+        )
+        summary.steps = row["total_steps"] or 0
+        summary.calories_burned = summary.steps * CALORIES_PER_STEP
+
+    DailySummary.objects.bulk_create(summaries.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("diet", "0009_food_sugars"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailySummary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                (
+                    "calories",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=9),
+                ),
+                ("fat", models.DecimalField(decimal_places=2, default=0, max_digits=9)),
+                (
+                    "carbohydrates",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=9),
+                ),
+                (
+                    "protein",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=9),
+                ),
+                (
+                    "sugars",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=9),
+                ),
+                ("steps", models.IntegerField(default=0)),
+                (
+                    "calories_burned",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=9),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_summaries",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="dailysummary",
+            constraint=models.UniqueConstraint(
+                fields=("user", "date"), name="diet_dailysummary_user_date_unique"
+            ),
+        ),
+        migrations.RunPython(backfill_daily_summaries, migrations.RunPython.noop),
+    ]
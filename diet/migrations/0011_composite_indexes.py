@@ -0,0 +1,62 @@
+# Generated by Django 4.2.16 on 2026-10-18 11:12
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+def merge_duplicate_food_names(apps, schema_editor):
+    """Fold foods whose names only differ by case into the oldest row before adding the unique index."""
+    Food = apps.get_model("diet", "Food")
+    Meal = apps.get_model("diet", "Meal")
+
+    lower_name = django.db.models.functions.text.Lower("name")
+    duplicates = (
+        Food.objects.annotate(name_lower=lower_name)
+        .values("name_lower")
+        .annotate(count=models.Count("id"))
+        .filter(count__gt=1)
+        .values_list("name_lower", flat=True)
+    )
+    for name_lower in list(duplicates):
+        ids = list(
+            Food.objects.annotate(name_lower=lower_name)
+            .filter(name_lower=name_lower)
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+        keeper, others = ids[0], ids[1:]
+        Meal.objects.filter(food_name_id__in=others).update(food_name_id=keeper)
+        Food.objects.filter(id__in=others).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("diet", "0010_dailysummary"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="meal",
+            index=models.Index(fields=["user", "date"], name="diet_meal_user_date_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="meal",
+            index=models.Index(
+                fields=["user", "date", "meal_type"],
+                name="diet_meal_user_date_type_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="stephistory",
+            index=models.Index(fields=["user", "date"], name="diet_step_user_date_idx"),
+        ),
+        migrations.RunPython(merge_duplicate_food_names, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="food",
+            constraint=models.UniqueConstraint(
+                django.db.models.functions.text.Lower("name"),
+                name="diet_food_name_ci_unique",
+            ),
+        ),
+    ]
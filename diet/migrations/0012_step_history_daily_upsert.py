@@ -0,0 +1,91 @@
+# Generated by Django 4.2.16 on 2026-10-18 11:14
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+from decimal import Decimal
+
+CALORIES_PER_STEP = Decimal("0.04")
+
+
+def merge_daily_step_rows(apps, schema_editor):
+    """Collapse the many rows per user and day into one before adding the unique constraint."""
+    StepHistory = apps.get_model("diet", "StepHistory")
+
+    duplicated_days = (
+        StepHistory.objects.values("user_id", "date")
+        .annotate(count=models.Count("id"), total_steps=models.Sum("steps"))
+        .filter(count__gt=1)
+    )
+    for day in list(duplicated_days):
+        rows = StepHistory.objects.filter(user_id=day["user_id"], date=day["date"])
+        keeper = rows.order_by("id").first()
+        rows.exclude(pk=keeper.pk).delete()
+        StepHistory.objects.filter(pk=keeper.pk).update(
+            steps=day["total_steps"],
+            calories_burned=day["total_steps"] * CALORIES_PER_STEP,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("diet", "0011_composite_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StepSampleKey",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("key", models.CharField(max_length=64)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name="stephistory",
+            name="diet_step_user_date_idx",
+        ),
+        migrations.AlterField(
+            model_name="stephistory",
+            name="calories_burned",
+            field=models.DecimalField(decimal_places=2, max_digits=7),
+        ),
+        migrations.AlterField(
+            model_name="stephistory",
+            name="date",
+            field=models.DateField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(merge_daily_step_rows, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="stephistory",
+            constraint=models.UniqueConstraint(
+                fields=("user", "date"), name="diet_step_user_date_unique"
+            ),
+        ),
+        migrations.AddField(
+            model_name="stepsamplekey",
+            name="user",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="step_sample_keys",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="stepsamplekey",
+            constraint=models.UniqueConstraint(
+                fields=("user", "key"), name="diet_stepsamplekey_user_key_unique"
+            ),
+        ),
+    ]
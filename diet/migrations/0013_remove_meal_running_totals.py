@@ -0,0 +1,25 @@
+# Generated by Django 4.2.16 on 2026-10-18 11:18
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("diet", "0012_step_history_daily_upsert"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="meal",
+            name="calories_consumed",
+        ),
+        migrations.RemoveField(
+            model_name="meal",
+            name="calories_remaining",
+        ),
+        migrations.RemoveField(
+            model_name="meal",
+            name="daily_calorie_goal",
+        ),
+    ]
@@ -0,0 +1,155 @@
+# Generated by Django 4.2.16 on 2026-10-18 11:21
+
+import diet.fields
+from django.db import migrations, models
+
+NUTRIENT_FIELDS = {
+    "dailysummary": ["calories", "calories_burned", "carbohydrates", "fat", "protein", "sugars"],
+    "food": ["calories", "carbohydrates", "fat", "portion_size", "protein", "sugars"],
+    "meal": ["calories", "carbohydrates", "fat", "portion_size", "protein", "sugars"],
+    "stephistory": ["calories_burned"],
+}
+
+
+def staging_fields():
+    """
+    Widen every nutrient column to DECIMAL(20, 2) first, so the values still fit
+    once they are multiplied by 100 and before the column becomes a BIGINT.
+    """
+    return [
+        migrations.AlterField(
+            model_name=model_name,
+            name=field_name,
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=20),
+        )
+        for model_name, field_names in NUTRIENT_FIELDS.items()
+        for field_name in field_names
+    ]
+
+
+def rescale(apps, schema_editor, expression):
+    quote_name = schema_editor.quote_name
+    for model_name, field_names in NUTRIENT_FIELDS.items():
+        model = apps.get_model("diet", model_name)
+        assignments = ", ".join(
+            f"{quote_name(column)} = {expression.format(quote_name(column))}"
+            for column in (model._meta.get_field(name).column for name in field_names)
+        )
+        schema_editor.execute(f"UPDATE {quote_name(model._meta.db_table)} SET {assignments}")
+
+
+def to_hundredths(apps, schema_editor):
+    rescale(apps, schema_editor, "CAST(ROUND({} * 100) AS BIGINT)")
+
+
+def from_hundredths(apps, schema_editor):
+    rescale(apps, schema_editor, "{} / 100.0")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("diet", "0013_remove_meal_running_totals"),
+    ]
+
+    operations = [
+        *staging_fields(),
+        migrations.RunPython(to_hundredths, from_hundredths),
+        migrations.AlterField(
+            model_name="dailysummary",
+            name="calories",
+            field=diet.fields.NutrientField(decimal_places=2, default=0, max_digits=9),
+        ),
+        migrations.AlterField(
+            model_name="dailysummary",
+            name="calories_burned",
+            field=diet.fields.NutrientField(decimal_places=2, default=0, max_digits=9),
+        ),
+        migrations.AlterField(
+            model_name="dailysummary",
+            name="carbohydrates",
+            field=diet.fields.NutrientField(decimal_places=2, default=0, max_digits=9),
+        ),
+        migrations.AlterField(
+            model_name="dailysummary",
+            name="fat",
+            field=diet.fields.NutrientField(decimal_places=2, default=0, max_digits=9),
+        ),
+        migrations.AlterField(
+            model_name="dailysummary",
+            name="protein",
+            field=diet.fields.NutrientField(decimal_places=2, default=0, max_digits=9),
+        ),
+        migrations.AlterField(
+            model_name="dailysummary",
+            name="sugars",
+            field=diet.fields.NutrientField(decimal_places=2, default=0, max_digits=9),
+        ),
+        migrations.AlterField(
+            model_name="food",
+            name="calories",
+            field=diet.fields.NutrientField(decimal_places=2, default=0, max_digits=6),
+        ),
+        migrations.AlterField(
+            model_name="food",
+            name="carbohydrates",
+            field=diet.fields.NutrientField(decimal_places=2, default=0, max_digits=6),
+        ),
+        migrations.AlterField(
+            model_name="food",
+            name="fat",
+            field=diet.fields.NutrientField(decimal_places=2, default=0, max_digits=6),
+        ),
+        migrations.AlterField(
+            model_name="food",
+            name="portion_size",
+            field=diet.fields.NutrientField(
+                decimal_places=2, default=100, max_digits=6
+            ),
+        ),
+        migrations.AlterField(
+            model_name="food",
+            name="protein",
+            field=diet.fields.NutrientField(decimal_places=2, default=0, max_digits=6),
+        ),
+        migrations.AlterField(
+            model_name="food",
+            name="sugars",
+            field=diet.fields.NutrientField(decimal_places=2, default=0, max_digits=6),
+        ),
+        migrations.AlterField(
+            model_name="meal",
+            name="calories",
+            field=diet.fields.NutrientField(decimal_places=2, default=0, max_digits=7),
+        ),
+        migrations.AlterField(
+            model_name="meal",
+            name="carbohydrates",
+            field=diet.fields.NutrientField(decimal_places=2, default=0, max_digits=7),
+        ),
+        migrations.AlterField(
+            model_name="meal",
+            name="fat",
+            field=diet.fields.NutrientField(decimal_places=2, default=0, max_digits=7),
+        ),
+        migrations.AlterField(
+            model_name="meal",
+            name="portion_size",
+            field=diet.fields.NutrientField(decimal_places=2, max_digits=7),
+        ),
+        migrations.AlterField(
+            model_name="meal",
+            name="protein",
+            field=diet.fields.NutrientField(decimal_places=2, default=0, max_digits=7),
+        ),
+        migrations.AlterField(
+            model_name="meal",
+            name="sugars",
+            field=diet.fields.NutrientField(decimal_places=2, default=0, max_digits=7),
+        ),
+        migrations.AlterField(
+            model_name="stephistory",
+            name="calories_burned",
+            field=diet.fields.NutrientField(decimal_places=2, max_digits=7),
+        ),
+    ]
@@ -0,0 +1,42 @@
+from django.db import migrations
+
+from diet.fixedpoint import divide_half_even, from_units, to_units
+
+
+def backfill_food_sugars(apps, schema_editor):
+    """
+    0009 added Food.sugars as 0 for every food, but the meals logged before it
+    hold the sugars of their food, scaled to the portion, from the nutrition CSV
+    of the time. Derive the per-100g value back from the largest such portion of
+    every food still at 0, so that recalculating those meals keeps their sugars.
+    Foods without such a meal stay at 0 until the catalogue is re-imported.
+    """
+    Food = apps.get_model("diet", "Food")
+    Meal = apps.get_model("diet", "Meal")
+    db_alias = schema_editor.connection.alias
+
+    meals = (
+        Meal.objects.using(db_alias)
+        .filter(food_name__sugars=0, sugars__gt=0, portion_size__gt=0)
+        .order_by("food_name_id", "-portion_size")
+        .values_list("food_name_id", "portion_size", "sugars")
+    )
+    sugars_by_food = {}
+    for food_id, portion_size, sugars in meals:
+        if food_id not in sugars_by_food:
+            # sugars / portion * 100 g, in hundredths and rounded half to even
+            sugars_by_food[food_id] = divide_half_even(to_units(sugars) * 10000, to_units(portion_size))
+
+    for food_id, units in sugars_by_food.items():
+        Food.objects.using(db_alias).filter(pk=food_id).update(sugars=from_units(units))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("diet", "0014_nutrient_fixed_point"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_food_sugars, migrations.RunPython.noop),
+    ]
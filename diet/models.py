@@ -1,37 +1,82 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Value
+from django.db.models.functions import Lower
 from django.utils import timezone
 from django.contrib.auth.models import User
 from decimal import Decimal
-import os 
-from django.conf import settings
-import csv
+from .fields import NutrientField
+from .fixedpoint import divide_half_even, from_units, to_units
+from .nutrition import calculate_portion_nutrition
+
+CALORIES_PER_STEP = Decimal('0.04')  # Calories burned per step
 
 class StepHistory(models.Model):
     user = models.ForeignKey('auth.User', on_delete=models.CASCADE)
     steps = models.IntegerField()
-    calories_burned = models.DecimalField(max_digits=5, decimal_places=2)
-    date = models.DateField(auto_now_add=True)
+    calories_burned = NutrientField(max_digits=7, decimal_places=2)
+    date = models.DateField(default=timezone.now)
+
+    class Meta:
+        # One row per user and day; diet.steps upserts every sample into it
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'date'], name='diet_step_user_date_unique'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.date} - {self.steps} steps"
 
     def calculate_calories_burned(self):
-        calories_burned = self.steps * 0.04  
-        return Decimal(calories_burned)
+        # steps * ten-thousandths of a kcal per step, rounded half to even to centi-kcal
+        return from_units(divide_half_even(int(self.steps) * to_units(CALORIES_PER_STEP, 4), 100))
 
     def save(self, *args, **kwargs):
         self.calories_burned = self.calculate_calories_burned()
-        super().save(*args, **kwargs)
+        # The DailySummary refresh in post_save commits together with the write
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
+
+class StepSampleKey(models.Model):
+    """Client-generated idempotency key of a step sample that has already been counted."""
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='step_sample_keys')
+    key = models.CharField(max_length=64)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='diet_stepsamplekey_user_key_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.key}"
+
+
+class FoodQuerySet(models.QuerySet):
+    def by_name(self, name):
+        """Case-insensitive exact name match that can use the LOWER(name) unique index."""
+        return self.alias(name_lower=Lower('name')).filter(name_lower=Lower(Value(name)))
+
+    def by_names(self, names):
+        """Case-insensitive lookup of several names in a single query."""
+        return self.alias(name_lower=Lower('name')).filter(name_lower__in=[Lower(Value(name)) for name in names])
 
 
 class Food(models.Model):
     name = models.CharField(max_length=255)
-    calories = models.DecimalField(max_digits=6, decimal_places=2, default=0)
-    fat = models.DecimalField(max_digits=6, decimal_places=2, default=0)
-    carbohydrates = models.DecimalField(max_digits=6, decimal_places=2, default=0)
-    protein = models.DecimalField(max_digits=6, decimal_places=2, default=0)
-    portion_size = models.DecimalField(max_digits=6, decimal_places=2, default=100)  # Default portion size in grams
+    calories = NutrientField(max_digits=6, decimal_places=2, default=0)
+    fat = NutrientField(max_digits=6, decimal_places=2, default=0)
+    carbohydrates = NutrientField(max_digits=6, decimal_places=2, default=0)
+    protein = NutrientField(max_digits=6, decimal_places=2, default=0)
+    sugars = NutrientField(max_digits=6, decimal_places=2, default=0)
+    portion_size = NutrientField(max_digits=6, decimal_places=2, default=100)  # Default portion size in grams
 
+    objects = FoodQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(Lower('name'), name='diet_food_name_ci_unique'),
+        ]
 
     def __str__(self):
         return self.name
@@ -49,74 +94,60 @@ class Meal(models.Model):
     meal_type = models.CharField(max_length=10, choices=MEAL_TYPE_CHOICES, default='snack')
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='meals')
     food_name = models.ForeignKey(Food, on_delete=models.CASCADE)
-    portion_size = models.DecimalField(max_digits=7, decimal_places=2)  # Portion size in grams
-    calories = models.DecimalField(max_digits=7, decimal_places=2, default=0.0)
-    fat = models.DecimalField(max_digits=7, decimal_places=2, default=0.0)
-    carbohydrates = models.DecimalField(max_digits=7, decimal_places=2, default=0.0)
-    protein = models.DecimalField(max_digits=7, decimal_places=2, default=0.0)
-    sugars = models.DecimalField(max_digits=7, decimal_places=2, default=0.0)
+    portion_size = NutrientField(max_digits=7, decimal_places=2)  # Portion size in grams
+    calories = NutrientField(max_digits=7, decimal_places=2, default=0)
+    fat = NutrientField(max_digits=7, decimal_places=2, default=0)
+    carbohydrates = NutrientField(max_digits=7, decimal_places=2, default=0)
+    protein = NutrientField(max_digits=7, decimal_places=2, default=0)
+    sugars = NutrientField(max_digits=7, decimal_places=2, default=0)
     date = models.DateField(default=timezone.now)
     time = models.TimeField(default=timezone.now)
-    calories_consumed = models.DecimalField(max_digits=7, decimal_places=2, default=0.0)  # Track total calories consumed
-    daily_calorie_goal = models.DecimalField(max_digits=7, decimal_places=2, default=2000.0)  # User's daily calorie goal
-    calories_remaining = models.DecimalField(max_digits=7, decimal_places=2, default=2000.0)  # Remaining calories
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'date'], name='diet_meal_user_date_idx'),
+            models.Index(fields=['user', 'date', 'meal_type'], name='diet_meal_user_date_type_idx'),
+        ]
 
     def __str__(self):
         return f"{self.food_name} ({self.meal_type})"
 
-    def get_nutrition_data(self, food_name):
-        """
-        Retrieves the nutrition data for the given food name from the CSV file.
-        """
-        data_dir = os.path.join(settings.BASE_DIR, 'diet/data')  # Path to your data folder
-        csv_file_path = os.path.join(data_dir, 'nutrition.csv')
-
-        # Function to clean the numeric values
-        def clean_value(value):
-            if value:
-                try:
-                    # Remove non-numeric characters and return the value as Decimal
-                    return Decimal(value.replace(' g', '').replace(' mg', '').replace('ml', '').strip())
-                except ValueError:
-                    return Decimal('0.0')  # If conversion fails, return 0.0
-            return Decimal('0.0')
-
-        try:
-            with open(csv_file_path, mode='r', newline='', encoding='utf-8') as csvfile:
-                reader = csv.DictReader(csvfile)
-                for row in reader:
-                    if row['name'].lower() == food_name.lower():
-                        return {
-                            'calories': clean_value(row['calories']),
-                            'fat': clean_value(row['fat']),
-                            'carbohydrates': clean_value(row['carbohydrate']),
-                            'protein': clean_value(row['protein']),
-                            'sugars': clean_value(row['sugars']),
-                        }
-        except FileNotFoundError:
-            return None
-
-        return None
-
     def calculate_nutrition(self):
         """
-        Calculate the nutrition values based on the portion size and food_name entered.
+        Calculate the nutrition values based on the portion size and the linked Food row.
         """
-        nutrition_data = self.get_nutrition_data(self.food_name.name)  # Get the nutrition data from the CSV
-        if nutrition_data:
-            portion_size = Decimal(str(self.portion_size))  # Ensure portion_size is a Decimal
-            factor = portion_size / Decimal('100.0') # Portion size ratio over 100g
-            self.calories = nutrition_data['calories'] * factor
-            self.fat = nutrition_data['fat'] * factor
-            self.carbohydrates = nutrition_data['carbohydrates'] * factor
-            self.protein = nutrition_data['protein'] * factor
-            self.sugars = nutrition_data['sugars'] * factor
-             # Ensure both calories are in Decimal type for the += operation
-            self.calories_consumed = Decimal(str(self.calories_consumed))  # Cast calories_consumed to Decimal
-            self.calories_consumed += self.calories  # Add the calories of this meal to the total consumed  # Add the calories of this meal to the total consumed
+        nutrition_data = calculate_portion_nutrition(self.food_name, self.portion_size)
+        self.calories = nutrition_data['calories']
+        self.fat = nutrition_data['fat']
+        self.carbohydrates = nutrition_data['carbohydrates']
+        self.protein = nutrition_data['protein']
+        self.sugars = nutrition_data['sugars']
 
     def save(self, *args, **kwargs):
         """Override the save method to calculate nutrition before saving."""
         self.calculate_nutrition()  # Calculate nutrition before saving
-        # self.calories_remaining = self.daily_calorie_goal - self.calories_consumed  # Calculate remaining calories
-        super().save(*args, **kwargs)
+        # The DailySummary refresh in post_save commits together with the write
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
+
+class DailySummary(models.Model):
+    """Per-user, per-day rollup of meals and steps, kept up to date by diet.summary."""
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_summaries')
+    date = models.DateField()
+    calories = NutrientField(max_digits=9, decimal_places=2, default=0)
+    fat = NutrientField(max_digits=9, decimal_places=2, default=0)
+    carbohydrates = NutrientField(max_digits=9, decimal_places=2, default=0)
+    protein = NutrientField(max_digits=9, decimal_places=2, default=0)
+    sugars = NutrientField(max_digits=9, decimal_places=2, default=0)
+    steps = models.IntegerField(default=0)
+    calories_burned = NutrientField(max_digits=9, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'date'], name='diet_dailysummary_user_date_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.date}"
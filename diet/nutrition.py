@@ -0,0 +1,67 @@
+import os
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+
+from .fixedpoint import divide_half_even, from_units, to_units
+
+
+NUTRIENT_COLUMNS = {
+    'calories': 'calories',
+    'fat': 'fat',
+    'carbohydrates': 'carbohydrate',
+    'protein': 'protein',
+    'sugars': 'sugars',
+}
+
+# Meal.portion_size has max_digits=7 and decimal_places=2
+MAX_PORTION_SIZE = Decimal('99999.99')
+
+
+def get_nutrition_csv_path():
+    """Path of the nutrition.csv shipped in the diet data folder."""
+    return os.path.join(settings.BASE_DIR, 'diet/data', 'nutrition.csv')
+
+
+def clean_value(value):
+    """Strip the unit suffix from a CSV cell and return it as a Decimal."""
+    if value:
+        try:
+            return Decimal(value.replace(' g', '').replace(' mg', '').replace('ml', '').strip())
+        except (ValueError, InvalidOperation):
+            return Decimal('0.0')
+    return Decimal('0.0')
+
+
+def parse_row(row):
+    """Map a nutrition.csv row onto the nutrient names used by the models."""
+    return {field: clean_value(row.get(column)) for field, column in NUTRIENT_COLUMNS.items()}
+
+
+def calculate_portion_nutrition(food, portion_size):
+    """
+    Scale the per-100g nutrient values stored on a Food row to the given portion size in grams.
+
+    Done in integer hundredths: per-100g value (x100) * portion (x100) / (100 g x 100),
+    rounded half to even like DecimalField quantizes on save.
+    """
+    portion_units = to_units(portion_size)
+    return {
+        field: from_units(divide_half_even(to_units(getattr(food, field)) * portion_units, 10000))
+        for field in NUTRIENT_COLUMNS
+    }
+
+
+def parse_portion_size(value):
+    """
+    Parse a portion size in grams, raising ValueError with a client-facing message
+    unless it is a finite number between 0 and MAX_PORTION_SIZE.
+    """
+    try:
+        portion_size = Decimal(str(value))
+    except InvalidOperation:
+        raise ValueError('Invalid portion size.')
+    # NaN, Infinity and 1e30 parse fine but cannot be stored
+    if not portion_size.is_finite() or not 0 <= portion_size <= MAX_PORTION_SIZE:
+        raise ValueError(f'Portion size must be a number between 0 and {MAX_PORTION_SIZE} grams.')
+    return portion_size
@@ -0,0 +1,53 @@
+import base64
+import json
+from datetime import date, time
+
+from django.db.models import Q
+from django.utils import timezone
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def parse_date_param(value):
+    """Parse a YYYY-MM-DD query parameter, raising ValueError on bad input."""
+    return timezone.datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def parse_page_size(value):
+    """Parse the page_size query parameter, capping it at MAX_PAGE_SIZE."""
+    if value in (None, ''):
+        return DEFAULT_PAGE_SIZE
+    page_size = int(value)
+    if page_size < 1:
+        raise ValueError("page_size must be positive.")
+    return min(page_size, MAX_PAGE_SIZE)
+
+
+def encode_cursor(meal_date, meal_time, meal_id):
+    """Build the opaque cursor pointing just after the given (date, time, meal_id) key."""
+    payload = json.dumps([meal_date.isoformat(), meal_time.isoformat(), meal_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Reverse encode_cursor, raising ValueError if the cursor was tampered with."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        meal_date, meal_time, meal_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return date.fromisoformat(meal_date), time.fromisoformat(meal_time), int(meal_id)
+    except (TypeError, ValueError) as exc:
+        raise ValueError("Invalid cursor.") from exc
+
+
+def meals_after_cursor(meals, cursor):
+    """
+    Keyset filter for meals ordered newest first on (date, time, meal_id):
+    keep only the rows that sort strictly after the cursor key.
+    """
+    meal_date, meal_time, meal_id = decode_cursor(cursor)
+    return meals.filter(
+        Q(date__lt=meal_date)
+        | Q(date=meal_date, time__lt=meal_time)
+        | Q(date=meal_date, time=meal_time, meal_id__lt=meal_id)
+    )
@@ -0,0 +1,241 @@
+import cProfile
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponseForbidden, JsonResponse
+
+try:
+    from pyinstrument import Profiler as SamplingProfiler
+except ImportError:  # pyinstrument is optional; fall back to cProfile
+    SamplingProfiler = None
+
+logger = logging.getLogger(__name__)
+
+PROFILE_FILE_RE = re.compile(r'^[\w.-]+\.(prof|collapsed|html)$')
+
+
+def get_profile_dir():
+    return getattr(settings, 'REQUEST_PROFILE_DIR', os.path.join(settings.BASE_DIR, 'profiles'))
+
+
+def wants_profile(request):
+    """Staff users opt in per request with ``?profile=1`` or an ``X-Profile: 1`` header."""
+    if request.GET.get('profile') != '1' and request.headers.get('X-Profile') != '1':
+        return False
+    user = getattr(request, 'user', None)
+    return user is not None and user.is_staff
+
+
+# Collapsed stacks ("a;b;c 123" per line) for flamegraph.pl / speedscope
+
+def frame_label(code):
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+class StackSampler(threading.Thread):
+    """
+    Sample the call stack of one thread every ``interval`` seconds.
+
+    cProfile records only caller -> callee edges, so the collapsed stacks of a
+    cProfile run come from this sampler running alongside it. Samples are taken
+    whenever this thread gets the GIL, i.e. at most every sys.getswitchinterval()
+    while the profiled thread is busy in Python code.
+    """
+
+    def __init__(self, thread_id, interval):
+        super().__init__(name='request-stack-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = defaultdict(int)
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+    def collapsed(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.samples.items())
+
+
+def collapse_sampling_session(session):
+    """Collapsed stacks in microseconds from a pyinstrument session."""
+    lines = []
+
+    def walk(frame, path):
+        path = path + [f'{frame.function} ({os.path.basename(frame.file_path or "")}:{frame.line_no})']
+        self_time = frame.total_self_time
+        if self_time > 0:
+            lines.append(f'{";".join(path)} {round(self_time * 1_000_000)}\n')
+        for child in frame.children:
+            walk(child, path)
+
+    root = session.root_frame()
+    if root is not None:
+        walk(root, [])
+    return ''.join(lines)
+
+
+class RequestProfile:
+    """
+    Profiles one request with pyinstrument when it is installed, otherwise with
+    cProfile plus a StackSampler for the collapsed stacks, and saves the result.
+    """
+
+    def __init__(self):
+        self.sampling = SamplingProfiler is not None
+        interval = getattr(settings, 'REQUEST_PROFILE_INTERVAL', 0.001)
+        if self.sampling:
+            self.profiler = SamplingProfiler(interval=interval)
+        else:
+            self.profiler = cProfile.Profile()
+            self.sampler = StackSampler(threading.get_ident(), interval)
+
+    def start(self):
+        if self.sampling:
+            self.profiler.start()
+        else:
+            self.profiler.enable()
+            self.sampler.start()
+
+    def stop(self):
+        if self.sampling:
+            self.profiler.stop()
+        else:
+            self.profiler.disable()
+            self.sampler.stop()
+
+    def save(self, request, response, duration):
+        directory = get_profile_dir()
+        os.makedirs(directory, exist_ok=True)
+        match = request.resolver_match
+        route = match.view_name.replace(':', '.') if match is not None else 'unmatched'
+        profile_id = f'{time.strftime("%Y%m%dT%H%M%S")}-{route}-{uuid.uuid4().hex[:8]}'
+
+        files = []
+        if self.sampling:
+            from pyinstrument.renderers import HTMLRenderer
+            files.append((f'{profile_id}.html', self.profiler.output(HTMLRenderer())))
+            files.append((f'{profile_id}.collapsed', collapse_sampling_session(self.profiler.last_session)))
+        else:
+            self.profiler.dump_stats(os.path.join(directory, f'{profile_id}.prof'))
+            files.append((f'{profile_id}.collapsed', self.sampler.collapsed()))
+        for name, content in files:
+            with open(os.path.join(directory, name), 'w', encoding='utf-8') as output:
+                output.write(content)
+
+        with open(os.path.join(directory, f'{profile_id}.json'), 'w', encoding='utf-8') as meta:
+            json.dump({
+                'method': request.method,
+                'path': request.path,
+                'route': route,
+                'status': response.status_code,
+                'duration_ms': round(duration * 1000, 2),
+                'profiler': 'pyinstrument' if self.sampling else 'cProfile',
+            }, meta)
+        prune_profiles(directory)
+        return profile_id
+
+
+def prune_profiles(directory):
+    """Keep only the REQUEST_PROFILE_KEEP most recent profiles."""
+    keep = getattr(settings, 'REQUEST_PROFILE_KEEP', 200)
+    metas = sorted(name for name in os.listdir(directory) if name.endswith('.json'))
+    for meta in metas[:max(len(metas) - keep, 0)]:
+        profile_id = meta[:-len('.json')]
+        for suffix in ('.json', '.prof', '.collapsed', '.html'):
+            try:
+                os.remove(os.path.join(directory, profile_id + suffix))
+            except FileNotFoundError:
+                pass
+
+
+class RequestProfilingMiddleware:
+    """
+    Profile a request when a staff user asks for it, or a random
+    REQUEST_PROFILE_SAMPLE_RATE fraction of all requests. Requested profiles
+    report their id in the ``X-Profile-Id`` response header; the files are
+    listed and downloaded through ``profile_list`` and ``profile_download``.
+    Must come after AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        requested = wants_profile(request)
+        sample_rate = getattr(settings, 'REQUEST_PROFILE_SAMPLE_RATE', 0.0)
+        if not requested and not (sample_rate and random.random() < sample_rate):
+            return self.get_response(request)
+
+        profile = RequestProfile()
+        try:
+            profile.start()
+        except (ValueError, RuntimeError):
+            # Another profiler is already active in this thread
+            logger.warning('Could not profile %s', request.path, exc_info=True)
+            return self.get_response(request)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            profile.stop()
+        duration = time.perf_counter() - started
+
+        try:
+            profile_id = profile.save(request, response, duration)
+        except OSError:
+            logger.exception('Could not save the profile of %s', request.path)
+            return response
+        if requested:
+            response['X-Profile-Id'] = profile_id
+        return response
+
+
+def profile_list(request):
+    """Staff-only list of the saved profiles, most recent first."""
+    if not request.user.is_staff:
+        return HttpResponseForbidden()
+    directory = get_profile_dir()
+    names = sorted(os.listdir(directory), reverse=True) if os.path.isdir(directory) else []
+    profiles = []
+    for name in names:
+        if name.endswith('.json'):
+            profile_id = name[:-len('.json')]
+            with open(os.path.join(directory, name), encoding='utf-8') as meta:
+                entry = json.load(meta)
+            entry['id'] = profile_id
+            entry['files'] = [
+                f'{profile_id}{suffix}' for suffix in ('.prof', '.collapsed', '.html')
+                if os.path.exists(os.path.join(directory, profile_id + suffix))
+            ]
+            profiles.append(entry)
+    return JsonResponse({'profiles': profiles})
+
+
+def profile_download(request, name):
+    """Staff-only download of one saved ``.prof``, ``.collapsed`` or ``.html`` file."""
+    if not request.user.is_staff:
+        return HttpResponseForbidden()
+    path = os.path.join(get_profile_dir(), name)
+    if not PROFILE_FILE_RE.match(name) or not os.path.isfile(path):
+        raise Http404('Profile not found.')
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=name)
@@ -0,0 +1,87 @@
+from django.db.models import F, Sum, Window
+
+from .models import Meal
+from .pagination import encode_cursor, meals_after_cursor
+
+MEAL_KEYSET_ORDER = ("-date", "-time", "-meal_id")
+
+# Response key -> Meal column (food_name__name is pulled in through the join)
+MEAL_PROJECTION = {
+    "id": "meal_id",
+    "food_name": "food_name__name",
+    "portion_size": "portion_size",
+    "calories": "calories",
+    "protein": "protein",
+    "carbohydrates": "carbohydrates",
+    "fat": "fat",
+    "sugars": "sugars",
+}
+
+
+def empty_meal_groups():
+    return {meal_type: [] for meal_type, _ in Meal.MEAL_TYPE_CHOICES}
+
+
+def project_meals(meals, *extra_columns):
+    """Restrict a Meal queryset to the listed columns plus the joined food name, in a single query."""
+    return meals.values_list("meal_type", *MEAL_PROJECTION.values(), *extra_columns)
+
+
+def group_meal_rows(rows):
+    """Group projected meal rows by meal type in one pass; columns beyond the projection are ignored."""
+    keys = tuple(MEAL_PROJECTION)
+    meal_groups = empty_meal_groups()
+    for meal_type, *values in rows:
+        meal_groups[meal_type].append(dict(zip(keys, values)))
+    return meal_groups
+
+
+def group_meals_by_type(meals):
+    """Run the projection for ``meals`` and group the rows by meal type in one pass."""
+    return group_meal_rows(project_meals(meals))
+
+
+def meal_page_rows(meals, page_size, cursor=None):
+    """Projected rows of one page of ``meals`` (newest first), plus one extra row to detect a next page."""
+    meals = meals.order_by(*MEAL_KEYSET_ORDER)
+    if cursor:
+        meals = meals_after_cursor(meals, cursor)
+    return project_meals(meals, "date", "time")[:page_size + 1]
+
+
+def group_meal_page(rows, page_size):
+    rows = list(rows)
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = encode_cursor(last[-2], last[-1], last[1])
+    return group_meal_rows(rows), next_cursor
+
+
+def paginate_meals(meals, page_size, cursor=None):
+    """
+    Return one page of ``meals`` (newest first) grouped by meal type, and the
+    cursor for the next page or None when this is the last one.
+    """
+    return group_meal_page(meal_page_rows(meals, page_size, cursor), page_size)
+
+
+async def apaginate_meals(meals, page_size, cursor=None):
+    """Async version of paginate_meals()."""
+    rows = [row async for row in meal_page_rows(meals, page_size, cursor)]
+    return group_meal_page(rows, page_size)
+
+
+def daily_running_totals(meals):
+    """
+    Annotate each meal with the calories consumed so far that day, computed with a
+    window function over the user's meals ordered by time instead of being stored.
+    """
+    return meals.annotate(
+        calories_consumed=Window(
+            expression=Sum("calories"),
+            partition_by=[F("user_id"), F("date")],
+            order_by=[F("time").asc(), F("meal_id").asc()],
+        )
+    ).order_by("date", "time", "meal_id")
@@ -0,0 +1,239 @@
+import bisect
+import threading
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connection, connections
+from django.db.models import Case, IntegerField, Value, When
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Length
+
+from .catalogue import get_catalogue_version
+from .models import Food
+
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+# Deeper pages are not served; SQLite also rejects OFFSETs beyond 64 bits
+MAX_SEARCH_OFFSET = 10_000
+FTS_TABLE = 'diet_food_fts'
+
+# FTS5 with the trigram tokenizer (SQLite >= 3.34) indexes every 3-character
+# substring of the name, so MATCH answers "contains" queries from the index.
+FTS_SCHEMA = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE}
+        USING fts5(name, content='diet_food', content_rowid='id', tokenize='trigram')""",
+    f"""CREATE TRIGGER IF NOT EXISTS diet_food_fts_insert AFTER INSERT ON diet_food BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name) VALUES (new.id, new.name);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS diet_food_fts_delete AFTER DELETE ON diet_food BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name) VALUES ('delete', old.id, old.name);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS diet_food_fts_update AFTER UPDATE OF name ON diet_food BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name) VALUES ('delete', old.id, old.name);
+        INSERT INTO {FTS_TABLE}(rowid, name) VALUES (new.id, new.name);
+    END""",
+]
+FTS_TRIGGERS = {'diet_food_fts_insert', 'diet_food_fts_delete', 'diet_food_fts_update'}
+
+_fts_available = {}
+
+
+def ensure_food_fts(using_connection):
+    """
+    Create the FTS5 index over Food.name and its sync triggers when they are missing.
+
+    SQLite drops a table's triggers whenever a migration rebuilds it, so this runs
+    after every migrate and rebuilds the index when anything had to be recreated.
+    Returns False when the SQLite build has no FTS5 trigram support.
+    """
+    if using_connection.vendor != 'sqlite':
+        return False
+
+    with using_connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'diet_food'")
+        existing_triggers = {row[0] for row in cursor.fetchall()}
+        table_names = using_connection.introspection.table_names(cursor)
+        if FTS_TABLE in table_names and FTS_TRIGGERS <= existing_triggers:
+            _fts_available[using_connection.alias] = True
+            return True
+
+        try:
+            for statement in FTS_SCHEMA:
+                cursor.execute(statement)
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        except DatabaseError:
+            _fts_available[using_connection.alias] = False
+            return False
+
+    _fts_available[using_connection.alias] = True
+    return True
+
+
+def fts_available():
+    """Whether the default connection has the FTS5 food index (checked once per process)."""
+    if connection.alias not in _fts_available:
+        _fts_available[connection.alias] = (
+            connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names()
+        )
+    return _fts_available[connection.alias]
+
+
+class TrigramIndex:
+    """
+    In-process trigram index over Food names, used when the database has no FTS5.
+
+    Built lazily on first use and rebuilt whenever the catalogue version changes,
+    which happens at least every DIET_CATALOGUE_CACHE_TIMEOUT seconds.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._names = {}
+        self._postings = {}
+        self._sorted_names = []
+
+    @staticmethod
+    def trigrams(text):
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    def _build(self, version):
+        names = {}
+        postings = defaultdict(set)
+        for pk, name in Food.objects.values_list('pk', 'name').iterator():
+            folded = name.casefold()
+            names[pk] = folded
+            for trigram in self.trigrams(folded):
+                postings[trigram].add(pk)
+        self._names = names
+        self._postings = dict(postings)
+        self._sorted_names = sorted((folded, pk) for pk, folded in names.items())
+        self._version = version
+
+    def invalidate(self):
+        with self._lock:
+            self._version = None
+            self._names, self._postings, self._sorted_names = {}, {}, []
+
+    def search(self, query):
+        """Return the ids of every food whose name contains ``query``, ranked best first."""
+        version = get_catalogue_version()
+        with self._lock:
+            if self._version != version:
+                self._build(version)
+            names, postings, sorted_names = self._names, self._postings, self._sorted_names
+
+        query = query.casefold()
+        if len(query) < 3:
+            # Too short for trigrams: walk the sorted names for prefix matches only
+            start = bisect.bisect_left(sorted_names, (query,))
+            matches = []
+            for folded, pk in sorted_names[start:]:
+                if not folded.startswith(query):
+                    break
+                matches.append(pk)
+        else:
+            candidates = None
+            for trigram in self.trigrams(query):
+                posting = postings.get(trigram, set())
+                candidates = posting if candidates is None else candidates & posting
+                if not candidates:
+                    return []
+            matches = [pk for pk in candidates if query in names[pk]]
+
+        return sorted(matches, key=lambda pk: (rank_name(names[pk], query), len(names[pk]), names[pk]))
+
+
+def rank_name(folded_name, folded_query):
+    """0 for an exact match, 1 for a prefix match, 2 for any other substring match."""
+    if folded_name == folded_query:
+        return 0
+    if folded_name.startswith(folded_query):
+        return 1
+    return 2
+
+
+trigram_index = TrigramIndex()
+
+
+def ranked(foods, query):
+    """Order a Food queryset with exact matches first, then prefix matches, then shorter names."""
+    return foods.annotate(
+        match_rank=Case(
+            When(name__iexact=query, then=Value(0)),
+            When(name__istartswith=query, then=Value(1)),
+            default=Value(2),
+            output_field=IntegerField(),
+        ),
+        name_length=Length('name'),
+    ).order_by('match_rank', 'name_length', 'name')
+
+
+def fts_search_queryset(query):
+    """Ranked Food queryset for ``query`` through the FTS5 index (prefix match for 1-2 characters)."""
+    if len(query) >= 3:
+        phrase = '"{}"'.format(query.replace('"', '""'))
+        foods = Food.objects.filter(
+            pk__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [phrase])
+        )
+    else:
+        foods = Food.objects.filter(name__istartswith=query)
+    return ranked(foods, query)
+
+
+def parse_search_page(params):
+    """
+    Read ``limit`` (capped at MAX_SEARCH_LIMIT) and ``offset`` from the query
+    parameters. Raises ValueError with a client-facing message.
+    """
+    try:
+        limit = int(params.get('limit', DEFAULT_SEARCH_LIMIT))
+        offset = int(params.get('offset', 0))
+    except ValueError:
+        raise ValueError('limit and offset must be integers.')
+    if limit < 1:
+        raise ValueError('limit must be positive.')
+    if not 0 <= offset <= MAX_SEARCH_OFFSET:
+        raise ValueError(f'offset must be between 0 and {MAX_SEARCH_OFFSET}.')
+    return min(limit, MAX_SEARCH_LIMIT), offset
+
+
+def next_search_offset(page, limit, offset):
+    """The offset of the next page, or None after the last page (or MAX_SEARCH_OFFSET)."""
+    if len(page) <= limit or offset + limit > MAX_SEARCH_OFFSET:
+        return None
+    return offset + limit
+
+
+def search_foods(query, limit=DEFAULT_SEARCH_LIMIT, offset=0):
+    """
+    Return up to ``limit`` foods matching ``query`` starting at ``offset``,
+    plus the offset of the next page (None when there are no more results).
+    """
+    query = query.strip()
+    if fts_available():
+        page = list(fts_search_queryset(query)[offset:offset + limit + 1])
+    else:
+        ids = trigram_index.search(query)[offset:offset + limit + 1]
+        foods_by_id = Food.objects.in_bulk(ids)
+        page = [foods_by_id[pk] for pk in ids if pk in foods_by_id]
+
+    return page[:limit], next_search_offset(page, limit, offset)
+
+
+async def asearch_foods(query, limit=DEFAULT_SEARCH_LIMIT, offset=0):
+    """Async version of search_foods()."""
+    query = query.strip()
+    if await sync_to_async(fts_available)():
+        page = [food async for food in fts_search_queryset(query)[offset:offset + limit + 1]]
+    else:
+        ids = (await sync_to_async(trigram_index.search)(query))[offset:offset + limit + 1]
+        foods_by_id = await Food.objects.ain_bulk(ids)
+        page = [foods_by_id[pk] for pk in ids if pk in foods_by_id]
+
+    return page[:limit], next_search_offset(page, limit, offset)
+
+
+def create_food_fts(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    """post_migrate hook keeping the SQLite FTS5 food index in place."""
+    ensure_food_fts(connections[using])
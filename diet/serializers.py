@@ -1,21 +1,50 @@
 # diet/serializers.py
 
 
+from decimal import Decimal
+
 from rest_framework import serializers
+from rest_framework.settings import api_settings
+from .fields import NutrientField as NutrientModelField
+from .instrumentation import TimedSerializerMixin
 from .models import Food, Meal, StepHistory
 
+
+class NutrientField(serializers.DecimalField):
+    """
+    Serializer field for NutrientField model values.
+
+    The model field already hands back Decimals with exactly ``decimal_places``
+    places, so those are rendered with str() instead of being re-quantized.
+    """
+
+    def to_representation(self, value):
+        coerce_to_string = getattr(self, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+        if (coerce_to_string and not self.localize and not self.normalize_output
+                and isinstance(value, Decimal) and value.as_tuple().exponent == -self.decimal_places):
+            return str(value)
+        return super().to_representation(value)
+
+
+class NutrientModelSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    serializer_field_mapping = {
+        **serializers.ModelSerializer.serializer_field_mapping,
+        NutrientModelField: NutrientField,
+    }
+
+
 # Serializer for StepHistory model
-class StepHistorySerializer(serializers.ModelSerializer):
+class StepHistorySerializer(NutrientModelSerializer):
     class Meta:
         model = StepHistory
         fields = ['user', 'steps', 'calories_burned', 'date']
 
-class FoodSerializer(serializers.ModelSerializer):
+class FoodSerializer(NutrientModelSerializer):
     class Meta:
         model = Food
         fields = ['name','portion_size','calories']
 
-class MealSerializer(serializers.ModelSerializer):
+class MealSerializer(NutrientModelSerializer):
     # Use SerializerMethodField to fetch the food name
     food_name = serializers.CharField(source='food_name.name')  # Get the food name
     class Meta:
@@ -0,0 +1,321 @@
+import atexit
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError, connection
+
+from .steps import ingest_step_samples
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; the spool needs it, the in-memory queue does not
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Failed flushes are retried after flush_interval, doubling up to this many seconds
+MAX_RETRY_DELAY = 60.0
+# Entries the spool directory keeps but never replays: samples that could not be written
+DEAD_LETTER_NAME = 'dead-letter.jsonl'
+
+
+class SpoolSegment:
+    """
+    One JSON-lines spool file, owned by the process holding an exclusive flock on
+    its ``.lock`` file. The lock dies with the process, so the segments of a
+    crashed worker can be taken over by the next queue that starts.
+    """
+
+    def __init__(self, path, lock_file):
+        self.path = path
+        self._lock_file = lock_file
+
+    @classmethod
+    def acquire(cls, path):
+        """Lock and return the segment at ``path``, or None while another process owns it."""
+        lock_file = open(f'{path}.lock', 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return None
+        return cls(path, lock_file)
+
+    def read(self):
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, encoding='utf-8') as spool:
+            return [line for line in spool if line.strip()]
+
+    def append(self, line):
+        with open(self.path, 'a', encoding='utf-8') as spool:
+            spool.write(line + '\n')
+
+    def rewrite(self, lines):
+        """Atomically replace the segment with ``lines``."""
+        temp_path = f'{self.path}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as spool:
+            for line in lines:
+                spool.write(line + '\n')
+            spool.flush()
+            os.fsync(spool.fileno())
+        os.replace(temp_path, self.path)
+
+    def release(self, remove=False):
+        if remove:
+            for path in (self.path, f'{self.path}.lock'):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+        self._lock_file.close()
+
+
+class StepWriteBehindQueue:
+    """
+    Buffer validated step samples in memory and write them to StepHistory from a
+    background thread, in coalesced batches.
+
+    A flush runs when ``batch_size`` samples are pending or ``flush_interval``
+    seconds have passed. With a ``spool_dir`` every enqueued batch is also
+    appended to this process's own segment file in that directory (see
+    SpoolSegment). On start-up the queue takes over the segments no live
+    process owns, and after each flush every owned segment is rewritten with
+    its entries that are still pending, so a crash does not lose samples and
+    no sample is spooled in two files. A crash between a flush committing and
+    the spool rewrite replays that batch; idempotency keys keep it from being
+    counted twice.
+
+    Samples that fail to flush stay queued and the worker backs off, retrying
+    after flush_interval, then twice as long, up to MAX_RETRY_DELAY. Samples
+    that can never be written (their user was deleted) or that failed
+    ``max_attempts`` times are logged and dead-lettered: appended to
+    DEAD_LETTER_NAME in the spool directory, when there is one.
+    """
+
+    def __init__(self, batch_size=500, flush_interval=1.0, spool_dir=None, max_attempts=5):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spool_dir = spool_dir
+        self.max_attempts = max_attempts
+        # (user_id, samples, segment the entry is spooled in, failed flush attempts)
+        self._pending = []
+        self._pending_count = 0
+        self._retry_delay = 0
+        self._spool_stale = False
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._stopping = False
+        self._thread = None
+        self._segment = None
+        self._adopted = []
+        if spool_dir:
+            self._open_spool()
+
+    # Spool files
+
+    @staticmethod
+    def _encode(user_id, samples):
+        return json.dumps({
+            'user_id': user_id,
+            'samples': [[date.isoformat(), steps, key] for date, steps, key in samples],
+        })
+
+    @staticmethod
+    def _decode(line):
+        entry = json.loads(line)
+        samples = [(datetime.date.fromisoformat(date), steps, key) for date, steps, key in entry['samples']]
+        return entry['user_id'], samples
+
+    def _open_spool(self):
+        if fcntl is None:
+            raise ImproperlyConfigured('DIET_STEP_QUEUE_SPOOL_DIR needs fcntl file locks (POSIX).')
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self._segment = SpoolSegment.acquire(
+            os.path.join(self.spool_dir, f'steps-{os.getpid()}-{uuid.uuid4().hex[:8]}.jsonl')
+        )
+        # Take over the segments left behind by processes that are gone
+        for name in sorted(os.listdir(self.spool_dir)):
+            path = os.path.join(self.spool_dir, name)
+            if not (name.startswith('steps-') and name.endswith('.jsonl')) or path == self._segment.path:
+                continue
+            segment = SpoolSegment.acquire(path)
+            if segment is None:
+                continue
+            for line in segment.read():
+                user_id, samples = self._decode(line)
+                self._pending.append((user_id, samples, segment, 0))
+                self._pending_count += len(samples)
+            self._adopted.append(segment)
+
+    def _rewrite_spool(self):
+        """Rewrite every owned segment with its pending entries; called with the lock held."""
+        # Until this succeeds the segments may still hold entries that were written
+        self._spool_stale = True
+        lines = {self._segment: []}
+        lines.update((segment, []) for segment in self._adopted)
+        for user_id, samples, segment, _ in self._pending:
+            lines[segment].append(self._encode(user_id, samples))
+        self._segment.rewrite(lines[self._segment])
+        for segment in list(self._adopted):
+            if lines[segment]:
+                segment.rewrite(lines[segment])
+            else:
+                segment.release(remove=True)
+                self._adopted.remove(segment)
+        self._spool_stale = False
+
+    def _dead_letter(self, user_id, entries):
+        samples = [sample for _, entry_samples, _, _ in entries for sample in entry_samples]
+        logger.error('Dropping %d step samples for user %s that could not be written', len(samples), user_id)
+        if self.spool_dir:
+            with open(os.path.join(self.spool_dir, DEAD_LETTER_NAME), 'a', encoding='utf-8') as dead_letters:
+                dead_letters.write(self._encode(user_id, samples) + '\n')
+
+    # Producer side
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='step-write-behind', daemon=True)
+                self._thread.start()
+
+    def enqueue(self, user_id, samples):
+        """Queue validated ``(date, steps, idempotency_key)`` samples for ``user_id``."""
+        if not samples:
+            return
+        with self._lock:
+            if self._stopping:
+                raise RuntimeError('The step queue is shutting down.')
+            if self._segment is not None:
+                self._segment.append(self._encode(user_id, samples))
+            self._pending.append((user_id, list(samples), self._segment, 0))
+            self._pending_count += len(samples)
+            if self._pending_count >= self.batch_size:
+                self._wakeup.notify()
+
+    def __len__(self):
+        return self._pending_count
+
+    # Consumer side
+
+    def _run(self):
+        while True:
+            with self._lock:
+                # A full batch only cuts the wait short while nothing is failing
+                deadline = time.monotonic() + (self._retry_delay or self.flush_interval)
+                while not self._stopping and time.monotonic() < deadline:
+                    if self._pending_count >= self.batch_size and not self._retry_delay:
+                        break
+                    self._wakeup.wait(deadline - time.monotonic())
+                stopping = self._stopping
+            try:
+                self.flush()
+            except Exception:
+                # Keep the worker alive; the samples are still pending and spooled
+                logger.exception('Step write-behind flush failed')
+                self._back_off()
+            if stopping:
+                return
+
+    def _back_off(self):
+        with self._lock:
+            self._retry_delay = min(max(self._retry_delay * 2, self.flush_interval), MAX_RETRY_DELAY)
+
+    def flush(self):
+        """Write everything pending so far; returns the number of samples written."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+                self._pending_count = 0
+                if not batch:
+                    if self._spool_stale:
+                        self._rewrite_spool()
+                    return 0
+
+            # Coalesce per user so each user costs one dedupe query and one upsert
+            entries_by_user = defaultdict(list)
+            for entry in batch:
+                entries_by_user[entry[0]].append(entry)
+
+            written = 0
+            failed = []
+            try:
+                for user_id, entries in entries_by_user.items():
+                    samples = [sample for _, entry_samples, _, _ in entries for sample in entry_samples]
+                    try:
+                        ingest_step_samples(User(pk=user_id), samples)
+                        written += len(samples)
+                    except Exception as exc:
+                        logger.exception('Could not flush %d step samples for user %s', len(samples), user_id)
+                        entries = [(*entry[:3], entry[3] + 1) for entry in entries]
+                        # IntegrityError: the user was deleted, retrying cannot help
+                        if isinstance(exc, IntegrityError) or any(entry[3] >= self.max_attempts for entry in entries):
+                            self._dead_letter(user_id, entries)
+                        else:
+                            failed.extend(entries)
+            finally:
+                if threading.current_thread() is self._thread:
+                    # The worker thread owns its own connection; do not leave it open between flushes
+                    connection.close()
+
+            with self._lock:
+                self._pending[:0] = failed
+                self._pending_count += sum(len(samples) for _, samples, _, _ in failed)
+                if self._segment is not None:
+                    self._rewrite_spool()
+            if failed:
+                self._back_off()
+            else:
+                with self._lock:
+                    self._retry_delay = 0
+            return written
+
+    def shutdown(self, timeout=None):
+        """Stop the worker after a final flush of everything still queued."""
+        with self._lock:
+            self._stopping = True
+            self._wakeup.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        else:
+            self.flush()
+        with self._lock:
+            if self._segment is not None and not self._pending:
+                self._segment.release(remove=True)
+                self._segment = None
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def write_behind_enabled():
+    return getattr(settings, 'DIET_STEP_WRITE_BEHIND', False)
+
+
+def get_step_queue():
+    """The process-wide step queue, started on first use and flushed at interpreter exit."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = StepWriteBehindQueue(
+                batch_size=getattr(settings, 'DIET_STEP_QUEUE_BATCH_SIZE', 500),
+                flush_interval=getattr(settings, 'DIET_STEP_QUEUE_FLUSH_INTERVAL', 1.0),
+                spool_dir=getattr(settings, 'DIET_STEP_QUEUE_SPOOL_DIR', None) or None,
+                max_attempts=getattr(settings, 'DIET_STEP_QUEUE_MAX_ATTEMPTS', 5),
+            )
+            _queue.start()
+            atexit.register(_queue.shutdown)
+        return _queue
@@ -0,0 +1,251 @@
+import datetime
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import DateField, F, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import CALORIES_PER_STEP, StepHistory, StepSampleKey
+from .pagination import parse_date_param
+from .summary import rebuild_daily_summaries
+
+MAX_STEP_BATCH_SIZE = 1000
+# Samples are added to the day's totals and cannot be taken back, so implausible ones are refused:
+# more steps than anyone walks in a day, or timestamps ahead of the server clock by more than the skew
+MAX_STEPS_PER_SAMPLE = 100_000
+MAX_STEP_CLOCK_SKEW = datetime.timedelta(minutes=5)
+
+
+def parse_step_sample(sample):
+    """
+    Validate one pushed step sample and return ``(date, steps, idempotency_key)``.
+    Raises ValueError with a client-facing message when the sample is invalid.
+    """
+    if not isinstance(sample, dict):
+        raise ValueError('Each sample must be an object.')
+
+    steps = sample.get('steps')
+    if steps is None:
+        raise ValueError('Steps are required.')
+    try:
+        steps = int(steps)
+    except (TypeError, ValueError):
+        raise ValueError('Steps must be an integer.')
+    if steps < 0:
+        raise ValueError('Steps cannot be negative.')
+    if steps > MAX_STEPS_PER_SAMPLE:
+        raise ValueError(f'Steps cannot exceed {MAX_STEPS_PER_SAMPLE} per sample.')
+
+    timestamp = sample.get('timestamp')
+    if timestamp:
+        recorded_at = parse_datetime(str(timestamp))
+        if recorded_at is None:
+            raise ValueError('Invalid timestamp. Use ISO 8601.')
+        if timezone.is_naive(recorded_at):
+            recorded_at = timezone.make_aware(recorded_at)
+        if recorded_at > timezone.now() + MAX_STEP_CLOCK_SKEW:
+            raise ValueError('Timestamp cannot be in the future.')
+    else:
+        recorded_at = timezone.now()
+
+    key = sample.get('idempotency_key')
+    if key is not None:
+        key = str(key)
+        if not key or len(key) > StepSampleKey._meta.get_field('key').max_length:
+            raise ValueError('Invalid idempotency_key.')
+
+    return timezone.localdate(recorded_at), steps, key
+
+
+def upsert_daily_steps(user_id, steps_by_date):
+    """
+    Add ``steps_by_date`` to the user's daily StepHistory rows in one
+    INSERT ... ON CONFLICT statement, creating the rows that do not exist yet.
+    """
+    if not steps_by_date:
+        return
+
+    table = connection.ops.quote_name(StepHistory._meta.db_table)
+    burned_field = StepHistory._meta.get_field('calories_burned')
+    date_field = StepHistory._meta.get_field('date')
+
+    params = []
+    for date, steps in steps_by_date.items():
+        params += [
+            user_id,
+            steps,
+            burned_field.get_db_prep_save(steps * CALORIES_PER_STEP, connection),
+            date_field.get_db_prep_save(date, connection),
+        ]
+    values = ', '.join(['(%s, %s, %s, %s)'] * len(steps_by_date))
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (user_id, steps, calories_burned, date) VALUES {values} "
+            f"ON CONFLICT (user_id, date) DO UPDATE SET "
+            f"steps = {table}.steps + excluded.steps, "
+            f"calories_burned = {table}.calories_burned + excluded.calories_burned",
+            params,
+        )
+
+
+def store_new_keys(user_id, keys):
+    """
+    Record the idempotency ``keys`` of the user in one INSERT ... ON CONFLICT DO
+    NOTHING RETURNING statement and return the ones that were not stored yet.
+    Needs SQLite 3.35+.
+    """
+    if not keys:
+        return set()
+
+    table = connection.ops.quote_name(StepSampleKey._meta.db_table)
+    created_at = StepSampleKey._meta.get_field('created_at').get_db_prep_save(timezone.now(), connection)
+
+    params = []
+    for key in keys:
+        params += [user_id, key, created_at]
+    values = ', '.join(['(%s, %s, %s)'] * len(keys))
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (user_id, key, created_at) VALUES {values} "
+            f"ON CONFLICT (user_id, key) DO NOTHING RETURNING key",
+            params,
+        )
+        return {key for key, in cursor.fetchall()}
+
+
+def ingest_step_samples(user, samples):
+    """
+    Count already validated ``(date, steps, idempotency_key)`` samples for ``user``.
+
+    Samples whose idempotency key was seen before (in this batch or an earlier
+    one) are dropped, the rest are summed per day and upserted. Returns the
+    number of accepted and duplicate samples and the dates that were touched.
+    """
+    with transaction.atomic():
+        return _ingest(user, samples)
+
+
+def _ingest(user, samples):
+    # Writing the keys first takes the write lock before anything is read, and the keys
+    # a concurrent retry of the same upload stored first simply do not come back
+    new_keys = store_new_keys(user.pk, list(dict.fromkeys(key for _, _, key in samples if key is not None)))
+
+    steps_by_date = defaultdict(int)
+    duplicates = 0
+    for date, steps, key in samples:
+        if key is not None:
+            if key not in new_keys:
+                duplicates += 1
+                continue
+            new_keys.discard(key)
+        steps_by_date[date] += steps
+
+    upsert_daily_steps(user.pk, steps_by_date)
+    rebuild_daily_summaries({(user.pk, date) for date in steps_by_date})
+
+    return {
+        'accepted': len(samples) - duplicates,
+        'duplicates': duplicates,
+        'dates': sorted(steps_by_date),
+    }
+
+
+STEP_BUCKETS = {
+    'day': lambda: F('date'),
+    'week': lambda: TruncWeek('date', output_field=DateField()),
+    'month': lambda: TruncMonth('date', output_field=DateField()),
+}
+DEFAULT_STEP_RANGES = {'day': '30d', 'week': '12w', 'month': '12m'}
+RANGE_UNITS = {'d': 1, 'w': 7}
+MAX_STEP_BUCKETS = 1000
+# Longest ``range``, in days: MAX_STEP_BUCKETS monthly buckets
+MAX_STEP_RANGE_DAYS = MAX_STEP_BUCKETS * 31
+RANGE_UNIT_DAYS = {**RANGE_UNITS, 'm': 31, 'y': 366}
+
+
+def parse_step_range(value, end):
+    """
+    Turn a ``range`` such as ``30d``, ``12w``, ``6m`` or ``1y`` into the first
+    date of a window ending at ``end`` (inclusive). Raises ValueError.
+    """
+    value = (value or '').strip().lower()
+    if len(value) < 2 or not value[:-1].isdigit() or int(value[:-1]) < 1:
+        raise ValueError('Invalid range. Use e.g. 30d, 12w, 6m or 1y.')
+    count, unit = int(value[:-1]), value[-1]
+    if unit not in RANGE_UNIT_DAYS:
+        raise ValueError('Invalid range. Use e.g. 30d, 12w, 6m or 1y.')
+    if count * RANGE_UNIT_DAYS[unit] > MAX_STEP_RANGE_DAYS:
+        raise ValueError(f'Range too large. Use at most {MAX_STEP_RANGE_DAYS} days.')
+
+    try:
+        if unit in RANGE_UNITS:
+            return end - datetime.timedelta(days=count * RANGE_UNITS[unit] - 1)
+        months = count if unit == 'm' else count * 12
+        # First day of the month ``months - 1`` months before ``end``
+        month_index = end.year * 12 + end.month - 1 - (months - 1)
+        return datetime.date(month_index // 12, month_index % 12 + 1, 1)
+    except (OverflowError, ValueError):  # before 0001-01-01
+        raise ValueError('Range too large. It must not start before 0001-01-01.')
+
+
+def parse_step_window(params, today):
+    """
+    Read ``bucket``, ``range``, ``from`` and ``to`` from the query parameters and
+    return ``(bucket, start, end)``. Raises ValueError with a client-facing message.
+    """
+    bucket = params.get('bucket', 'day')
+    if bucket not in STEP_BUCKETS:
+        raise ValueError('Invalid bucket. Choose one of: day, week, month.')
+
+    try:
+        end = parse_date_param(params['to']) if params.get('to') else today
+        start = parse_date_param(params['from']) if params.get('from') else None
+    except ValueError:
+        raise ValueError('Invalid date format. Use YYYY-MM-DD.')
+    if start is None:
+        start = parse_step_range(params.get('range') or DEFAULT_STEP_RANGES[bucket], end)
+
+    if start > end:
+        raise ValueError("'from' must not be after 'to'.")
+    bucket_days = {'day': 1, 'week': 7, 'month': 28}[bucket]
+    if (end - start).days // bucket_days > MAX_STEP_BUCKETS:
+        raise ValueError(f'At most {MAX_STEP_BUCKETS} buckets can be requested at once.')
+    return bucket, start, end
+
+
+def bucket_step_rows(user, start, end, bucket):
+    """``(bucket_start, steps, calories_burned)`` sums between ``start`` and ``end``, ordered by bucket start."""
+    return (
+        StepHistory.objects.filter(user=user, date__gte=start, date__lte=end)
+        .annotate(bucket_start=STEP_BUCKETS[bucket]())
+        .values('bucket_start')
+        .annotate(total_steps=Sum('steps'), total_calories_burned=Sum('calories_burned'))
+        .order_by('bucket_start')
+        .values_list('bucket_start', 'total_steps', 'total_calories_burned')
+    )
+
+
+def step_bucket_columns(rows):
+    columns = {'start': [], 'steps': [], 'calories_burned': []}
+    for bucket_start, steps, calories_burned in rows:
+        columns['start'].append(bucket_start.isoformat())
+        columns['steps'].append(steps)
+        columns['calories_burned'].append(str(calories_burned))
+    return columns
+
+
+def bucket_step_history(user, start, end, bucket):
+    """
+    Sum steps and calories burned per day, week or month between ``start`` and
+    ``end`` in the database, returned as parallel columns ordered by bucket start.
+    """
+    return step_bucket_columns(bucket_step_rows(user, start, end, bucket))
+
+
+async def abucket_step_history(user, start, end, bucket):
+    """Async version of bucket_step_history()."""
+    return step_bucket_columns([row async for row in bucket_step_rows(user, start, end, bucket)])
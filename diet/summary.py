@@ -0,0 +1,96 @@
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import QuerySet, Sum
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .models import CALORIES_PER_STEP, DailySummary, Meal, StepHistory
+
+MEAL_TOTAL_FIELDS = ('calories', 'fat', 'carbohydrates', 'protein', 'sugars')
+SUMMARY_FIELDS = MEAL_TOTAL_FIELDS + ('steps', 'calories_burned')
+
+
+def summary_key(instance):
+    """(user_id, date) of the DailySummary row a meal or step record counts towards."""
+    return instance.user_id, instance._meta.get_field('date').to_python(instance.date)
+
+
+def rebuild_daily_summaries(keys):
+    """
+    Recompute the DailySummary rows for the given (user_id, date) pairs from
+    the Meal and StepHistory tables and upsert them in one statement.
+    """
+    keys = {(user_id, date) for user_id, date in keys if user_id is not None and date is not None}
+    if not keys:
+        return
+
+    user_ids = {user_id for user_id, _ in keys}
+    dates = {date for _, date in keys}
+    totals = {key: dict.fromkeys(SUMMARY_FIELDS, Decimal('0')) for key in keys}
+
+    with transaction.atomic(savepoint=False):
+        # Serialize concurrent rebuilds for the same users so the last writer always sees every committed row.
+        # A row lock where the database has them; SQLite transactions take the whole database's
+        # write lock at BEGIN (transaction_mode IMMEDIATE), or at the meal/step write before this.
+        list(User.objects.select_for_update().filter(pk__in=user_ids).values_list('pk', flat=True))
+
+        meal_totals = (
+            Meal.objects.filter(user_id__in=user_ids, date__in=dates)
+            .values('user_id', 'date')
+            .annotate(**{field: Sum(field) for field in MEAL_TOTAL_FIELDS})
+        )
+        for row in meal_totals:
+            key = (row['user_id'], row['date'])
+            if key in totals:
+                totals[key].update({field: row[field] or Decimal('0') for field in MEAL_TOTAL_FIELDS})
+
+        step_totals = (
+            StepHistory.objects.filter(user_id__in=user_ids, date__in=dates)
+            .values('user_id', 'date')
+            .annotate(total_steps=Sum('steps'))
+        )
+        for row in step_totals:
+            key = (row['user_id'], row['date'])
+            if key in totals:
+                totals[key]['steps'] = row['total_steps'] or 0
+                totals[key]['calories_burned'] = totals[key]['steps'] * CALORIES_PER_STEP
+
+        DailySummary.objects.bulk_create(
+            [DailySummary(user_id=user_id, date=date, **values) for (user_id, date), values in totals.items()],
+            update_conflicts=True,
+            unique_fields=['user', 'date'],
+            update_fields=list(SUMMARY_FIELDS),
+        )
+
+
+@receiver(post_init, sender=Meal)
+@receiver(post_init, sender=StepHistory)
+def remember_summary_key(sender, instance, **kwargs):
+    instance._summary_key = summary_key(instance)
+
+
+@receiver(post_save, sender=Meal)
+@receiver(post_save, sender=StepHistory)
+def update_summary_on_save(sender, instance, **kwargs):
+    keys = {summary_key(instance)}
+    # A record moved to another day (or user) also changes the summary it used to count towards
+    keys.add(instance._summary_key)
+    rebuild_daily_summaries(keys)
+    instance._summary_key = summary_key(instance)
+
+
+def deleted_with_user(origin):
+    """Whether a delete cascades from deleting users, whose DailySummary rows are deleted along with them."""
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return issubclass(model, User)
+
+
+@receiver(post_delete, sender=Meal)
+@receiver(post_delete, sender=StepHistory)
+def update_summary_on_delete(sender, instance, origin=None, **kwargs):
+    # Rebuilding would re-insert a summary for a user whose row is about to go (FOREIGN KEY constraint failed)
+    if deleted_with_user(origin):
+        return
+    rebuild_daily_summaries({summary_key(instance)})
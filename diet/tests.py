@@ -1,3 +1,596 @@
-from django.test import TestCase
+import base64
+import datetime
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.db import OperationalError, connection, models
+from django.db.migrations.executor import MigrationExecutor
+from django.http import HttpResponse
+from django.test import AsyncClient, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.authentication import BasicAuthentication
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from accounts.models import Profile
+from project.routers import PrimaryReplicaRouter, ReplicaPinningMiddleware, pin_key
+from .encoders import FastJSONRenderer, RowEncoder
+from .models import DailySummary, Food, Meal, StepHistory, StepSampleKey
+from .pagination import encode_cursor
+from .serializers import FoodSerializer, NutrientModelSerializer, StepHistorySerializer
+from .step_queue import DEAD_LETTER_NAME, StepWriteBehindQueue
+from .steps import MAX_STEP_RANGE_DAYS, MAX_STEPS_PER_SAMPLE, ingest_step_samples, parse_step_sample, parse_step_window
+
+
+class UserDeletionTests(TransactionTestCase):
+    # Not TestCase: SQLite only checks the foreign keys when the deleting transaction commits
+
+    def test_deleting_a_user_with_meals_and_steps(self):
+        user = User.objects.create_user(username='leaving', password='pw')
+        food = Food.objects.create(name='Apple', calories=Decimal('52'))
+        Meal.objects.create(user=user, food_name=food, portion_size=Decimal('150'))
+        StepHistory.objects.create(user=user, steps=1000)
+        self.assertTrue(DailySummary.objects.filter(user=user).exists())
+
+        user.delete()
+
+        self.assertFalse(User.objects.filter(username='leaving').exists())
+        self.assertFalse(Meal.objects.exists())
+        self.assertFalse(StepHistory.objects.exists())
+        self.assertFalse(DailySummary.objects.exists())
+
+    def test_deleting_a_meal_still_updates_the_summary(self):
+        user = User.objects.create_user(username='eater', password='pw')
+        food = Food.objects.create(name='Bread', calories=Decimal('250'))
+        Meal.objects.create(user=user, food_name=food, portion_size=Decimal('100'))
+        meal = Meal.objects.create(user=user, food_name=food, portion_size=Decimal('100'))
+
+        meal.delete()
+
+        self.assertEqual(DailySummary.objects.get(user=user).calories, Decimal('250.00'))
+
+
+class ExportFormatTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='exporter', password='pw')
+        self.client.force_login(self.user)
+
+    def test_unknown_format_is_a_bad_request(self):
+        response = self.client.get(reverse('diet:export_history'), {'format': 'xml'})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"error": "Invalid format. Choose one of: ndjson, csv."})
+
+    def test_csv_export(self):
+        response = self.client.get(reverse('diet:export_history'), {'format': 'csv'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'type,date,time,meal_type'))
+
+
+@override_settings(DATABASE_REPLICA_ALIASES=['replica1'], REPLICA_APPS=['diet'])
+class ReplicaPinningTests(TransactionTestCase):
+    # Not TestCase: reads inside a transaction always stay on the primary
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='basic', password='pw')
+        self.router = PrimaryReplicaRouter()
+        credentials = base64.b64encode(b'basic:pw').decode()
+        self.request = RequestFactory().post('/diet/create/', HTTP_AUTHORIZATION=f'Basic {credentials}')
+        self.request.user = AnonymousUser()  # what AuthenticationMiddleware leaves for Basic auth
+
+    def authenticate(self, request):
+        """What an @api_view does first: DRF authenticates and sets request.user."""
+        Request(request, authenticators=[BasicAuthentication()]).user
+
+    def test_basic_auth_write_pins_the_user(self):
+        def view(request):
+            self.authenticate(request)
+            self.router.db_for_write(Meal)
+            return HttpResponse()
+
+        ReplicaPinningMiddleware(view)(self.request)
+
+        self.assertIsNotNone(cache.get(pin_key(self.user.pk)))
+
+    def test_pin_is_checked_once_the_view_has_authenticated(self):
+        cache.set(pin_key(self.user.pk), True)
+        routed = []
+
+        def view(request):
+            routed.append(self.router.db_for_read(Meal))
+            self.authenticate(request)
+            routed.append(self.router.db_for_read(Meal))
+            return HttpResponse()
+
+        ReplicaPinningMiddleware(view)(self.request)
+
+        self.assertEqual(routed, ['replica1', 'default'])
+
+
+class StepWindowTests(SimpleTestCase):
+    today = datetime.date(2024, 6, 15)
+
+    def test_ranges(self):
+        self.assertEqual(parse_step_window({'range': '30d'}, self.today), ('day', datetime.date(2024, 5, 17), self.today))
+        self.assertEqual(parse_step_window({'bucket': 'month', 'range': '1y'}, self.today)[1], datetime.date(2023, 7, 1))
+
+    def test_too_large_ranges(self):
+        for value in ('999999d', '99999y', f'{MAX_STEP_RANGE_DAYS + 1}d'):
+            with self.subTest(value=value), self.assertRaisesMessage(ValueError, 'Range too large'):
+                parse_step_window({'bucket': 'month', 'range': value}, self.today)
+
+    def test_range_before_year_one(self):
+        with self.assertRaisesMessage(ValueError, 'Range too large'):
+            parse_step_window({'range': '2d', 'to': '0001-01-01'}, self.today)
+
+    def test_invalid_dates(self):
+        with self.assertRaisesMessage(ValueError, 'Invalid date format'):
+            parse_step_window({'from': '2024-13-01'}, self.today)
+
+
+class StepHistoryRangeTests(TestCase):
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user(username='walker', password='pw'))
+
+    def test_too_large_range_is_a_bad_request(self):
+        response = self.client.get(reverse('diet:get_step_history'), {'range': '999999d'})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Range too large', response.json()['error'])
+
+    async def test_too_large_range_is_a_bad_request_async(self):
+        client = AsyncClient()
+        client.cookies = self.client.cookies
+        response = await client.get(reverse('diet:async_get_step_history'), {'range': '999999d'})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Range too large', response.json()['error'])
+
+
+class FoodSearchPageTests(TestCase):
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user(username='searcher', password='pw'))
+        Food.objects.bulk_create([Food(name=f'Apple {index}', calories=Decimal('52')) for index in range(3)])
+
+    def test_out_of_range_offsets_are_bad_requests(self):
+        for offset in ('-1', '10001', '100000000000000000000', 'x'):
+            with self.subTest(offset=offset):
+                response = self.client.get(reverse('diet:food_list'), {'search': 'apple', 'offset': offset})
+                self.assertEqual(response.status_code, 400)
+
+    def test_large_limits_are_capped(self):
+        response = self.client.get(reverse('diet:food_list'), {'search': 'apple', 'limit': '100000000000000000000'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['foods']), 3)
+
+    async def test_out_of_range_offset_is_a_bad_request_async(self):
+        client = AsyncClient()
+        client.cookies = self.client.cookies
+        response = await client.get(reverse('diet:async_food_list'), {'search': 'apple', 'offset': '100000000000000000000'})
+
+        self.assertEqual(response.status_code, 400)
+
+
+class StepSampleTests(SimpleTestCase):
+
+    def test_valid_sample(self):
+        self.assertEqual(
+            parse_step_sample({'steps': '120', 'timestamp': '2024-06-15T08:30:00+00:00', 'idempotency_key': 'a'}),
+            (datetime.date(2024, 6, 15), 120, 'a'),
+        )
+
+    def test_implausible_samples_are_rejected(self):
+        future = (timezone.now() + datetime.timedelta(hours=1)).isoformat()
+        for sample, message in [
+            ({'steps': -1}, 'negative'),
+            ({'steps': MAX_STEPS_PER_SAMPLE + 1}, 'cannot exceed'),
+            ({'steps': 10 ** 12}, 'cannot exceed'),
+            ({'steps': 10, 'timestamp': future}, 'future'),
+            ({'steps': 10, 'timestamp': '9999-12-31T00:00:00+00:00'}, 'future'),
+        ]:
+            with self.subTest(sample=sample), self.assertRaisesMessage(ValueError, message):
+                parse_step_sample(sample)
+
+
+class StepIngestionTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='stepper', password='pw')
+        self.day = datetime.date(2024, 6, 15)
+
+    def test_samples_are_summed_per_day(self):
+        result = ingest_step_samples(self.user, [(self.day, 100, None), (self.day, 50, None)])
+
+        self.assertEqual((result['accepted'], result['duplicates'], result['dates']), (2, 0, [self.day]))
+        record = StepHistory.objects.get(user=self.user)
+        self.assertEqual((record.steps, record.calories_burned), (150, Decimal('6.00')))
+        self.assertEqual(DailySummary.objects.get(user=self.user, date=self.day).steps, 150)
+
+    def test_repeated_keys_are_counted_once(self):
+        ingest_step_samples(self.user, [(self.day, 100, 'a'), (self.day, 100, 'a'), (self.day, 30, 'b')])
+        # The same upload, retried
+        result = ingest_step_samples(self.user, [(self.day, 100, 'a'), (self.day, 30, 'b'), (self.day, 5, 'c')])
+
+        self.assertEqual((result['accepted'], result['duplicates']), (1, 2))
+        self.assertEqual(StepHistory.objects.get(user=self.user).steps, 135)
+
+    def test_batch_reports_invalid_samples(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('diet:record_steps_batch'), {'samples': [
+            {'steps': 100, 'idempotency_key': 'a'},
+            {'steps': 10 ** 12},
+            {'steps': 100, 'idempotency_key': 'a'},
+        ]}, content_type='application/json')
+
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual((response.json()['accepted'], response.json()['duplicates']), (1, 1))
+        self.assertEqual([error['index'] for error in response.json()['errors']], [1])
+        self.assertEqual(StepHistory.objects.get(user=self.user).steps, 100)
+
+
+class ConcurrentStepIngestionTests(TransactionTestCase):
+    # Not TestCase: every thread needs its own connection and transactions
+
+    def test_concurrent_retries_of_the_same_upload(self):
+        user = User.objects.create_user(username='racer', password='pw')
+        day = datetime.date(2024, 6, 15)
+        samples = [(day, 10, f'key-{index}') for index in range(20)]
+        errors = []
+
+        def upload():
+            try:
+                ingest_step_samples(user, samples)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=upload) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(StepHistory.objects.get(user=user).steps, 200)
+        self.assertEqual(DailySummary.objects.get(user=user, date=day).steps, 200)
+
+
+class StepWriteBehindQueueTests(TransactionTestCase):
+    # Not TestCase: a deleted user only fails the foreign key check when the flush commits
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='queued', password='pw')
+        self.day = datetime.date(2024, 6, 15)
+        spool = tempfile.TemporaryDirectory()
+        self.addCleanup(spool.cleanup)
+        self.spool_dir = spool.name
+
+    def queue(self, **kwargs):
+        queue = StepWriteBehindQueue(flush_interval=0.01, spool_dir=self.spool_dir, **kwargs)
+        self.addCleanup(queue.shutdown, 5)
+        return queue
+
+    def test_flush_coalesces_and_deduplicates(self):
+        queue = self.queue()
+        queue.enqueue(self.user.pk, [(self.day, 100, 'a')])
+        queue.enqueue(self.user.pk, [(self.day, 100, 'a'), (self.day, 20, None)])
+
+        self.assertEqual(queue.flush(), 3)
+        self.assertEqual(len(queue), 0)
+        self.assertEqual(StepHistory.objects.get(user=self.user).steps, 120)
+
+    def test_samples_of_a_crashed_process_are_replayed(self):
+        crashed = StepWriteBehindQueue(spool_dir=self.spool_dir)
+        crashed.enqueue(self.user.pk, [(self.day, 100, 'a')])
+        crashed._segment._lock_file.close()  # the process died; its flock is gone
+
+        queue = self.queue()
+
+        self.assertEqual(len(queue), 1)
+        queue.flush()
+        self.assertEqual(StepHistory.objects.get(user=self.user).steps, 100)
+        self.assertEqual([name for name in os.listdir(self.spool_dir) if name.endswith('.jsonl')], [os.path.basename(queue._segment.path)])
+
+    def test_samples_of_a_deleted_user_are_dead_lettered(self):
+        queue = self.queue()
+        queue.enqueue(self.user.pk + 1000, [(self.day, 100, None)])
+        queue.enqueue(self.user.pk, [(self.day, 50, None)])
+
+        with self.assertLogs('diet.step_queue', 'ERROR'):
+            self.assertEqual(queue.flush(), 1)
+
+        self.assertEqual(len(queue), 0)
+        self.assertEqual(StepHistory.objects.get(user=self.user).steps, 50)
+        with open(os.path.join(self.spool_dir, DEAD_LETTER_NAME)) as dead_letters:
+            self.assertEqual(len(dead_letters.readlines()), 1)
+
+    def test_failures_are_retried_then_dead_lettered(self):
+        queue = self.queue(max_attempts=2)
+        queue.enqueue(self.user.pk, [(self.day, 100, None)])
+
+        with mock.patch('diet.step_queue.ingest_step_samples', side_effect=OperationalError('database is locked')), \
+                self.assertLogs('diet.step_queue', 'ERROR'):
+            queue.flush()
+            self.assertEqual(len(queue), 1)
+            self.assertGreater(queue._retry_delay, 0)
+            queue.flush()
+
+        self.assertEqual(len(queue), 0)
+        self.assertTrue(os.path.exists(os.path.join(self.spool_dir, DEAD_LETTER_NAME)))
+
+    def test_worker_survives_a_failing_flush(self):
+        queue = self.queue()
+        rewrite = queue._segment.rewrite
+        calls = []
+
+        def fail_once(lines):
+            calls.append(lines)
+            if len(calls) == 1:
+                raise OSError('disk full')
+            rewrite(lines)
+
+        with mock.patch.object(queue._segment, 'rewrite', side_effect=fail_once), self.assertLogs('diet.step_queue', 'ERROR'):
+            queue.start()
+            queue.enqueue(self.user.pk, [(self.day, 100, 'a')])
+            deadline = time.monotonic() + 5
+            while len(calls) < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+        self.assertTrue(queue._thread.is_alive())
+        self.assertEqual(calls[-1], [])  # the spool was emptied by the retry
+        self.assertEqual(StepHistory.objects.get(user=self.user).steps, 100)
+
+
+class MigrationTestCase(TransactionTestCase):
+    """Migrate the test database back to ``migrate_from``, then forward to ``migrate_to`` in the test."""
+    migrate_from = migrate_to = None
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        self.latest = executor.loader.graph.leaf_nodes('diet')
+        executor.migrate([('diet', self.migrate_from)])
+        self.apps = executor.loader.project_state([('diet', self.migrate_from)]).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.latest)
+
+    def migrate(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate([('diet', self.migrate_to)])
+        return executor.loader.project_state([('diet', self.migrate_to)]).apps
+
+
+class BackfillFoodSugarsMigrationTests(MigrationTestCase):
+    migrate_from = '0014_nutrient_fixed_point'
+    migrate_to = '0015_backfill_food_sugars'
+
+    def test_sugars_are_derived_from_the_largest_portion(self):
+        Food, Meal = self.apps.get_model('diet', 'Food'), self.apps.get_model('diet', 'Meal')
+        user = self.apps.get_model('auth', 'User').objects.create(username='historic')
+        sweet = Food.objects.create(name='Sweet', calories=100)
+        plain = Food.objects.create(name='Plain', calories=100)
+        known = Food.objects.create(name='Known', calories=100, sugars=Decimal('9.99'))
+        for food, portion_size, sugars in [
+            (sweet, '140', '4.94'), (sweet, '150', '5.30'), (plain, '100', '0'), (known, '100', '1.00'),
+        ]:
+            Meal.objects.create(user_id=user.pk, food_name=food, portion_size=Decimal(portion_size), sugars=Decimal(sugars))
+
+        Food = self.migrate().get_model('diet', 'Food')
+
+        self.assertEqual(
+            dict(Food.objects.values_list('name', 'sugars')),
+            {'Sweet': Decimal('3.53'), 'Plain': Decimal('0.00'), 'Known': Decimal('9.99')},
+        )
+
+
+class MealCursorPaginationTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='pager', password='pw')
+        self.client.force_login(self.user)
+        food = Food.objects.create(name='Rice', calories=Decimal('130'))
+        slots = [
+            (datetime.date(2024, 6, 15), datetime.time(8, 0)),
+            # Three meals sharing date and time; only meal_id orders them
+            (datetime.date(2024, 6, 14), datetime.time(12, 0)),
+            (datetime.date(2024, 6, 14), datetime.time(12, 0)),
+            (datetime.date(2024, 6, 14), datetime.time(12, 0)),
+            (datetime.date(2024, 6, 14), datetime.time(7, 30)),
+            (datetime.date(2024, 6, 13), datetime.time(19, 0)),
+            (datetime.date(2024, 6, 13), datetime.time(19, 0)),
+        ]
+        meals = [
+            Meal.objects.create(user=self.user, food_name=food, portion_size=Decimal('100'), date=date, time=time)
+            for date, time in slots
+        ]
+        self.expected = [meal.meal_id for meal in sorted(meals, key=lambda meal: (meal.date, meal.time, meal.meal_id), reverse=True)]
+
+    def page(self, url_name, cursor=None, page_size=2):
+        params = {'page_size': page_size, **({'cursor': cursor} if cursor else {})}
+        response = self.client.get(reverse(url_name), params)
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        next_cursor = body.pop('next_cursor')
+        ids = sorted((meal['id'] for meals in body.values() for meal in meals), key=self.expected.index)
+        return ids, next_cursor
+
+    def walk(self, url_name):
+        ids, cursor = self.page(url_name)
+        pages = [ids]
+        while cursor:
+            ids, cursor = self.page(url_name, cursor)
+            pages.append(ids)
+        return pages
+
+    def test_pages_cover_every_meal_once_in_order(self):
+        pages = self.walk('diet:meal_list')
+
+        self.assertEqual([meal_id for page in pages for meal_id in page], self.expected)
+        self.assertEqual([len(page) for page in pages], [2, 2, 2, 1])
+
+    def test_async_list_pages_the_same_way(self):
+        self.assertEqual(self.walk('diet:async_meal_list'), self.walk('diet:meal_list'))
+
+    def test_pages_are_stable_when_meals_are_added(self):
+        first, cursor = self.page('diet:meal_list')
+        Meal.objects.create(
+            user=self.user, food_name=Food.objects.get(), portion_size=Decimal('50'),
+            date=datetime.date(2024, 6, 16), time=datetime.time(9, 0),
+        )
+
+        second, _ = self.page('diet:meal_list', cursor)
+
+        self.assertEqual(first + second, self.expected[:4])
+
+    def test_cursor_in_the_middle_of_a_tie(self):
+        tied = Meal.objects.get(meal_id=self.expected[2])
+
+        ids, _ = self.page('diet:meal_list', encode_cursor(tied.date, tied.time, tied.meal_id), page_size=10)
+
+        self.assertEqual(ids, self.expected[3:])
+
+    def test_invalid_cursors_are_bad_requests(self):
+        for cursor in [
+            'not a cursor',
+            base64.urlsafe_b64encode(b'{"date": "2024-06-14"}').decode(),
+            base64.urlsafe_b64encode(b'[1, 2, 3]').decode(),
+            base64.urlsafe_b64encode(b'["2024-13-01", "12:00:00", 1]').decode(),
+            base64.urlsafe_b64encode(b'["2024-06-14", "12:00:00", "x"]').decode(),
+            base64.urlsafe_b64encode(b'\xff\xfe').decode(),
+        ]:
+            with self.subTest(cursor=cursor):
+                response = self.client.get(reverse('diet:meal_list'), {'cursor': cursor})
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {"error": "Invalid cursor."})
+
+
+class NutrientFieldTests(TestCase):
+
+    def stored(self, food, column):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT {column} FROM diet_food WHERE id = %s', [food.pk])
+            return cursor.fetchone()[0]
+
+    def test_values_are_stored_as_hundredths(self):
+        food = Food.objects.create(name='Oats', calories=Decimal('389.12'), fat=Decimal('6.9'), protein=0)
+
+        self.assertEqual((self.stored(food, 'calories'), self.stored(food, 'fat'), self.stored(food, 'protein')), (38912, 690, 0))
+        food = Food.objects.get(pk=food.pk)
+        self.assertEqual((food.calories, food.fat, food.protein), (Decimal('389.12'), Decimal('6.90'), Decimal('0.00')))
+        self.assertEqual(str(food.fat), '6.90')
+
+    def test_extra_places_round_half_to_even(self):
+        for value, units in [('1.005', 100), ('1.015', 102), ('1.025', 102), ('1.0051', 101), ('0.125', 12)]:
+            with self.subTest(value=value):
+                food = Food.objects.create(name=f'Food {value}', calories=Decimal(value))
+                self.assertEqual(self.stored(food, 'calories'), units)
+                self.assertEqual(Food.objects.get(pk=food.pk).calories, Decimal(units).scaleb(-2))
+
+    def test_lookups_and_sums_use_the_same_scale(self):
+        Food.objects.create(name='A', calories=Decimal('0.10'))
+        Food.objects.create(name='B', calories=Decimal('0.20'))
+
+        self.assertEqual(Food.objects.filter(calories__gt=Decimal('0.15')).get().name, 'B')
+        self.assertEqual(Food.objects.aggregate(total=models.Sum('calories'))['total'], Decimal('0.30'))
+
+
+class NutrientFixedPointMigrationTests(MigrationTestCase):
+    migrate_from = '0013_remove_meal_running_totals'
+    migrate_to = '0014_nutrient_fixed_point'
+
+    def test_existing_rows_are_converted_to_hundredths(self):
+        user = self.apps.get_model('auth', 'User').objects.create(username='historic')
+        food = self.apps.get_model('diet', 'Food').objects.create(
+            name='Oats', calories=Decimal('389.12'), fat=Decimal('6.90'), sugars=Decimal('0.99'),
+        )
+        self.apps.get_model('diet', 'Meal').objects.create(
+            user_id=user.pk, food_name=food, portion_size=Decimal('150.00'), calories=Decimal('583.68'),
+        )
+        self.apps.get_model('diet', 'StepHistory').objects.create(
+            user_id=user.pk, steps=1234, calories_burned=Decimal('49.36'), date=datetime.date(2024, 6, 15),
+        )
+
+        apps = self.migrate()
+
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT calories, fat, sugars, portion_size FROM diet_food')
+            self.assertEqual(cursor.fetchone(), (38912, 690, 99, 10000))
+            cursor.execute('SELECT portion_size, calories FROM diet_meal')
+            self.assertEqual(cursor.fetchone(), (15000, 58368))
+            cursor.execute('SELECT calories_burned FROM diet_stephistory')
+            self.assertEqual(cursor.fetchone(), (4936,))
+        food = apps.get_model('diet', 'Food').objects.get()
+        self.assertEqual((food.calories, food.fat, food.sugars), (Decimal('389.12'), Decimal('6.90'), Decimal('0.99')))
+
+
+class RowEncoderTests(TestCase):
+
+    def setUp(self):
+        cache.clear()  # the catalogue
+        self.user = User.objects.create_user(username='encoder', password='pw')
+        self.client.force_login(self.user)
+        Food.objects.create(name='Crème brûlée \u2028', calories=Decimal('289.5'), portion_size=Decimal('0.01'))
+        Food.objects.create(name='Water', calories=0)
+        StepHistory.objects.create(user=self.user, steps=12345, date=datetime.date(2024, 6, 15))
+        StepHistory.objects.create(user=self.user, steps=0, date=datetime.date(2024, 6, 14))
+
+    def assertSameJSON(self, serializer_class, queryset):
+        expected = JSONRenderer().render(serializer_class(queryset, many=True).data)
+        self.assertEqual(FastJSONRenderer().render(RowEncoder(serializer_class).encode_queryset(queryset)), expected)
+
+    def test_food_and_step_history(self):
+        self.assertSameJSON(FoodSerializer, Food.objects.order_by('id'))
+        self.assertSameJSON(StepHistorySerializer, StepHistory.objects.order_by('-date'))
+
+    def test_datetime_and_null_fields(self):
+        StepSampleKey.objects.create(user=self.user, key='a')
+        Profile.objects.filter(user=self.user).update(weight=70.5, height=None, age=None)
+
+        class StepSampleKeySerializer(NutrientModelSerializer):
+            class Meta:
+                model = StepSampleKey
+                fields = ['user', 'key', 'created_at']
+
+        class ProfileSerializer(serializers.ModelSerializer):
+            class Meta:
+                model = Profile
+                fields = ['user', 'weight', 'height', 'age']
+
+        self.assertSameJSON(StepSampleKeySerializer, StepSampleKey.objects.all())
+        self.assertSameJSON(ProfileSerializer, Profile.objects.all())
+
+    def test_renderer_falls_back_for_decimals_and_datetimes(self):
+        data = {
+            'decimal': Decimal('1.10'), 'datetime': timezone.now(), 'date': datetime.date(2024, 6, 15),
+            'none': None, 'text': 'a\u2028b\u2029c',
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_views(self):
+        foods = JSONRenderer().render({'foods': FoodSerializer(Food.objects.all(), many=True).data})
+        steps = JSONRenderer().render(StepHistorySerializer(StepHistory.objects.order_by('-date'), many=True).data)
+        for url_name, expected in [
+            ('diet:food_list', foods), ('diet:async_food_list', foods),
+            ('diet:get_step_history', steps), ('diet:async_get_step_history', steps),
+        ]:
+            with self.subTest(url_name=url_name):
+                response = self.client.get(reverse(url_name), HTTP_ACCEPT='application/json')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.content, expected)
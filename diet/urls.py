@@ -1,21 +1,30 @@
 
 # urls.py
 from django.urls import path,include
-from . import views
+from . import async_views, views
 
 app_name = 'diet'
 urlpatterns = [
     path('food_types/', views.list_food_types, name='list_food_types'),
     path('food/', views.get_food_list, name='food_list'),
     path('create/', views.create_meal, name='create_meal'),
+    path('create/batch/', views.create_meal_batch, name='create_meal_batch'),
     path('', views.get_meal_list, name='meal_list'),
     path('<int:meal_id>/', views.get_meal, name='meal_detail'),
     # path('<str:food_name>/', views.get_meal, name='meal_by_food_name'),
     path('<int:meal_id>/update/', views.update_meal, name='update_meal'),
     path('<int:meal_id>/delete/', views.delete_meal, name='meal_delete'),
     path('calorie-info/', views.get_calorie_info, name='get_calorie_info'),
+    path('daily-totals/', views.get_daily_totals, name='get_daily_totals'),
     path('record_steps/', views.record_steps, name='record_steps'),
+    path('record_steps/batch/', views.record_steps_batch, name='record_steps_batch'),
     path('step_history/', views.get_step_history, name='get_step_history'),
+    path('export/', views.export_history, name='export_history'),
+    # ASGI-native versions of the read-heavy endpoints
+    path('async/food/', async_views.get_food_list, name='async_food_list'),
+    path('async/', async_views.get_meal_list, name='async_meal_list'),
+    path('async/calorie-info/', async_views.get_calorie_info, name='async_get_calorie_info'),
+    path('async/step_history/', async_views.get_step_history, name='async_get_step_history'),
     # path('', include('diet.formss.urls')),
 ]
 
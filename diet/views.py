@@ -1,15 +1,35 @@
 # views.py
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
 from rest_framework.response import Response
 from rest_framework import status
-from django.db.models import Q, Sum
+from django.contrib.auth.models import User
+from django.http import StreamingHttpResponse
 from django.utils import timezone
+from django.utils.http import parse_etags
+from django.db import transaction
 from decimal import Decimal
 from drf_yasg.utils import swagger_auto_schema
-from .models import Food, Meal , StepHistory
+from drf_yasg import openapi
+from accounts.cache import get_profile_goal
+from .models import DailySummary, Food, Meal , StepHistory
 from django.utils import timezone
 from .serializers import FoodSerializer, MealSerializer , StepHistorySerializer
+from .queries import daily_running_totals, group_meals_by_type, paginate_meals
+from .nutrition import parse_portion_size
+from .pagination import MAX_PAGE_SIZE, parse_date_param, parse_page_size
+from .catalogue import get_cached_catalogue, get_catalogue
+from .encoders import FastJSONRenderer, row_encoder
+from .export import EXPORT_FORMATS, ExportContentNegotiation, export_querysets, stream_csv, stream_ndjson
+from .summary import rebuild_daily_summaries, summary_key
+from .steps import (
+    MAX_STEP_BATCH_SIZE, STEP_BUCKETS, bucket_step_history, ingest_step_samples, parse_step_sample, parse_step_window,
+)
+from .step_queue import get_step_queue, write_behind_enabled
+from .search import MAX_SEARCH_LIMIT, MAX_SEARCH_OFFSET, parse_search_page, search_foods
+
+MAX_MEAL_BATCH_SIZE = 500
 
 # 1- Retrieve a list of all available meal types
 @swagger_auto_schema(method='get', responses={200: 'List of available meal types'})
@@ -23,21 +43,40 @@ def list_food_types(request):
 
 
 # 2- Retrieve a list of all available foods, with optional search query
-@swagger_auto_schema(method='get', responses={200: FoodSerializer(many=True)})
+@swagger_auto_schema(
+    method='get',
+    manual_parameters=[
+        openapi.Parameter('search', openapi.IN_QUERY, description="Part of a food name", type=openapi.TYPE_STRING),
+        openapi.Parameter('limit', openapi.IN_QUERY, description=f"Search results per page (max {MAX_SEARCH_LIMIT})", type=openapi.TYPE_INTEGER),
+        openapi.Parameter('offset', openapi.IN_QUERY, description=f"next_offset returned by the previous page (max {MAX_SEARCH_OFFSET})", type=openapi.TYPE_INTEGER),
+    ],
+    responses={200: FoodSerializer(many=True)},
+)
 @api_view(['GET'])
+@renderer_classes([FastJSONRenderer, BrowsableAPIRenderer])
 @permission_classes([IsAuthenticated])
 def get_food_list(request):
-    """Retrieve a list of all available foods, with an optional search query."""
+    """Retrieve a list of all available foods, or a ranked page of matches for the search query."""
     
     search_query = request.GET.get('search', '').strip()  
     
     if search_query:
-        foods = Food.objects.filter(Q(name__icontains=search_query))
-    else:
-        foods = Food.objects.all()
+        try:
+            limit, offset = parse_search_page(request.GET)
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        foods, next_offset = search_foods(search_query, limit, offset)
+        serializer = FoodSerializer(foods, many=True)
+        return Response({"foods": serializer.data, "next_offset": next_offset}, status=status.HTTP_200_OK)
 
-    serializer = FoodSerializer(foods, many=True)
-    return Response({"foods": serializer.data}, status=status.HTTP_200_OK)
+    # The full catalogue only changes on import, so it is served from the versioned cache
+    catalogue = get_cached_catalogue() or get_catalogue()
+    # The ETag hashes the content, so an entry rebuilt after expiry still matches what the client has
+    if catalogue['etag'] in parse_etags(request.headers.get('If-None-Match', '')):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': catalogue['etag']})
+
+    return Response(catalogue['data'], status=status.HTTP_200_OK, headers={'ETag': catalogue['etag']})
 
 
 # 3- Create a new meal
@@ -55,16 +94,20 @@ def create_meal(request):
     food_name = data['food_name'].strip()
 
     try:
-        food = Food.objects.get(name__iexact=food_name)
+        food = Food.objects.by_name(food_name).get()
     except Food.DoesNotExist:
         return Response({'error': 'Food not found.'}, status=status.HTTP_400_BAD_REQUEST)
 
-    portion_size = data.get('portion_size', 100)
+    try:
+        portion_size = parse_portion_size(data.get('portion_size', 100))
+    except ValueError as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
     meal_type = data.get('meal_type', 'snack').strip()
 
     if meal_type not in ['breakfast', 'lunch', 'dinner', 'snack']:
         return Response({'error': 'Invalid meal type. Choose one of: breakfast, lunch, dinner, snack.'}, status=status.HTTP_400_BAD_REQUEST)
 
+    # Meal.save() calculates the nutrition, so a single create is enough
     meal = Meal.objects.create(
         user=request.user,
         food_name=food,
@@ -72,42 +115,123 @@ def create_meal(request):
         portion_size=portion_size,
     )
 
-    meal.calculate_nutrition()
-    meal.save()
-
     serializer = MealSerializer(meal)
     return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
-# 4- Retrieve all meals for the authenticated user, grouped by meal type
-@swagger_auto_schema(method='get', responses={200: "Meals grouped by meal type"})
+# 3b- Create several meals at once (a whole plate, or an offline queue replayed by the app)
+@swagger_auto_schema(
+    method='post',
+    request_body=openapi.Schema(
+        type=openapi.TYPE_OBJECT,
+        properties={'items': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'food_name': openapi.Schema(type=openapi.TYPE_STRING),
+                'portion_size': openapi.Schema(type=openapi.TYPE_NUMBER),
+                'meal_type': openapi.Schema(type=openapi.TYPE_STRING),
+            },
+        ))},
+    ),
+    responses={201: 'Created meals', 207: 'Created meals and per-item errors', 400: 'Per-item errors'},
+)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def create_meal_batch(request):
+    """Create several meals in one request, resolving foods in one query and inserting them in bulk."""
+    
+    items = request.data.get('items') if isinstance(request.data, dict) else request.data
+    if not isinstance(items, list) or not items:
+        return Response({'error': 'A non-empty list of items is required.'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(items) > MAX_MEAL_BATCH_SIZE:
+        return Response({'error': f'At most {MAX_MEAL_BATCH_SIZE} items can be created at once.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    names = {item['food_name'].strip() for item in items if isinstance(item, dict) and isinstance(item.get('food_name'), str)}
+    foods = {food.name.lower(): food for food in Food.objects.by_names(names)}
+
+    meals = []
+    errors = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not isinstance(item.get('food_name'), str):
+            errors.append({'index': index, 'error': 'Food name is required.'})
+            continue
+
+        food = foods.get(item['food_name'].strip().lower())
+        if food is None:
+            errors.append({'index': index, 'error': 'Food not found.'})
+            continue
+
+        meal_type = str(item.get('meal_type', 'snack')).strip()
+        if meal_type not in ['breakfast', 'lunch', 'dinner', 'snack']:
+            errors.append({'index': index, 'error': 'Invalid meal type. Choose one of: breakfast, lunch, dinner, snack.'})
+            continue
+
+        try:
+            portion_size = parse_portion_size(item.get('portion_size', 100))
+        except ValueError as exc:
+            errors.append({'index': index, 'error': str(exc)})
+            continue
+
+        meal = Meal(user=request.user, food_name=food, meal_type=meal_type, portion_size=portion_size)
+        meal.calculate_nutrition()
+        meals.append(meal)
+
+    if meals:
+        with transaction.atomic():
+            Meal.objects.bulk_create(meals)
+            # bulk_create sends no post_save signals
+            rebuild_daily_summaries({summary_key(meal) for meal in meals})
+
+    if not meals:
+        response_status = status.HTTP_400_BAD_REQUEST
+    elif errors:
+        response_status = status.HTTP_207_MULTI_STATUS
+    else:
+        response_status = status.HTTP_201_CREATED
+
+    return Response({
+        'created': MealSerializer(meals, many=True).data,
+        'errors': errors,
+    }, status=response_status)
+
+
+# 4- Retrieve the meals of the authenticated user, grouped by meal type, one page at a time
+@swagger_auto_schema(
+    method='get',
+    manual_parameters=[
+        openapi.Parameter('from', openapi.IN_QUERY, description="First date to include (YYYY-MM-DD)", type=openapi.TYPE_STRING),
+        openapi.Parameter('to', openapi.IN_QUERY, description="Last date to include (YYYY-MM-DD)", type=openapi.TYPE_STRING),
+        openapi.Parameter('page_size', openapi.IN_QUERY, description=f"Meals per page (max {MAX_PAGE_SIZE})", type=openapi.TYPE_INTEGER),
+        openapi.Parameter('cursor', openapi.IN_QUERY, description="next_cursor returned by the previous page", type=openapi.TYPE_STRING),
+    ],
+    responses={200: "Meals grouped by meal type, plus next_cursor"},
+)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_meal_list(request):
-    """Retrieve all meals for the authenticated user, grouped by meal type."""
+    """Retrieve the meals of the authenticated user, newest first, grouped by meal type and paginated by cursor."""
     
     meals = Meal.objects.filter(user=request.user)
-    
-    meal_groups = {
-        "breakfast": [],
-        "lunch": [],
-        "dinner": [],
-        "snack": []
-    }
-
-    for meal in meals:
-        meal_data = {
-            "id": meal.meal_id,
-            "food_name": meal.food_name.name,
-            "portion_size": meal.portion_size,
-            "calories": meal.calories,
-            "protein":meal.protein,
-            "carbohydrates":meal.carbohydrates,
-            "fat":meal.fat,
-            "sugars":meal.sugars,
-        }
-        meal_groups[meal.meal_type].append(meal_data)
 
+    try:
+        if request.GET.get('from'):
+            meals = meals.filter(date__gte=parse_date_param(request.GET['from']))
+        if request.GET.get('to'):
+            meals = meals.filter(date__lte=parse_date_param(request.GET['to']))
+    except ValueError:
+        return Response({"error": "Invalid date format. Use YYYY-MM-DD."}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        page_size = parse_page_size(request.GET.get('page_size'))
+    except ValueError:
+        return Response({"error": "page_size must be a positive integer."}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        meal_groups, next_cursor = paginate_meals(meals, page_size, request.GET.get('cursor'))
+    except ValueError:
+        return Response({"error": "Invalid cursor."}, status=status.HTTP_400_BAD_REQUEST)
+
+    meal_groups["next_cursor"] = next_cursor
     return Response(meal_groups, status=status.HTTP_200_OK)
 
 
@@ -147,40 +271,63 @@ def list_foods_by_day(request):
     date_str = request.GET.get('date', None)
     if date_str:
         try:
-            # Parse the date string to a datetime object
-            date = timezone.datetime.strptime(date_str, "%Y-%m-%d").date()
+            # Parse the date string to a date object
+            date = parse_date_param(date_str)
         except ValueError:
             return Response({"error": "Invalid date format. Use YYYY-MM-DD."}, status=status.HTTP_400_BAD_REQUEST)
     else:
         # If no date is provided, default to today's date
         date = timezone.now().date()
     
-    # Fetch meals for the specific date
-    meals = Meal.objects.filter(user=request.user, date=date)
-    
-    # Group meals by meal type
-    meal_groups = {
-        "breakfast": [],
-        "lunch": [],
-        "dinner": [],
-        "snack": []
-    }
-
-    for meal in meals:
-        meal_data = {
-            "id": meal.meal_id,
-            "food_name": meal.food_name.name,
-            "portion_size": meal.portion_size,
-            "calories": meal.calories,
-            "protein": meal.protein,
-            "carbohydrates": meal.carbohydrates,
-            "fat": meal.fat,
-            "sugars": meal.sugars,
-        }
-        meal_groups[meal.meal_type].append(meal_data)
+    # Fetch meals for the specific date, grouped by meal type
+    meal_groups = group_meals_by_type(Meal.objects.filter(user=request.user, date=date))
 
     return Response(meal_groups, status=status.HTTP_200_OK)
 
+# 6b- Running calorie totals for a day, derived from the meals instead of stored on them
+@swagger_auto_schema(
+    method='get',
+    manual_parameters=[openapi.Parameter('date', openapi.IN_QUERY, description="Day to report (YYYY-MM-DD), defaults to today", type=openapi.TYPE_STRING)],
+    responses={200: 'Meals of the day with the calories consumed and remaining after each one'},
+)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_daily_totals(request):
+    """Retrieve the meals of a day with the running calories consumed and remaining after each meal."""
+    
+    date_str = request.GET.get('date', None)
+    try:
+        date = parse_date_param(date_str) if date_str else timezone.now().date()
+    except ValueError:
+        return Response({"error": "Invalid date format. Use YYYY-MM-DD."}, status=status.HTTP_400_BAD_REQUEST)
+
+    daily_calorie_goal = get_profile_goal(request.user)['daily_calorie_goal']
+    meals = daily_running_totals(Meal.objects.filter(user=request.user, date=date)).values_list(
+        'meal_id', 'food_name__name', 'meal_type', 'time', 'calories', 'calories_consumed',
+    )
+
+    meal_totals = []
+    calories_consumed = Decimal('0.00')
+    for meal_id, food_name, meal_type, time, calories, calories_consumed in meals:
+        meal_totals.append({
+            'id': meal_id,
+            'food_name': food_name,
+            'meal_type': meal_type,
+            'time': time.isoformat(),
+            'calories': str(calories),
+            'calories_consumed': str(calories_consumed),
+            'calories_remaining': str(daily_calorie_goal - calories_consumed),
+        })
+
+    return Response({
+        'date': date.isoformat(),
+        'calorie_goal': str(daily_calorie_goal),
+        'total_calories_consumed': str(calories_consumed),
+        'remaining_calories': str(daily_calorie_goal - calories_consumed),
+        'meals': meal_totals,
+    }, status=status.HTTP_200_OK)
+
+
 # 7- Update an existing meal
 @swagger_auto_schema(method='put', request_body=MealSerializer, responses={200: MealSerializer})
 @api_view(['PUT'])
@@ -192,7 +339,7 @@ def update_meal(request, meal_id):
     food_name = data.get('food_name', '').strip()
 
     try:
-        food_instance = Food.objects.get(name__iexact=food_name)
+        food_instance = Food.objects.by_name(food_name).get()
     except Food.DoesNotExist:
         return Response({"error": "Food not found."}, status=status.HTTP_404_NOT_FOUND)
 
@@ -201,11 +348,15 @@ def update_meal(request, meal_id):
     except Meal.DoesNotExist:
         return Response({"error": "Meal not found."}, status=status.HTTP_404_NOT_FOUND)
 
+    try:
+        portion_size = parse_portion_size(data.get('portion_size', meal.portion_size))
+    except ValueError as exc:
+        return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
     meal.food_name = food_instance
-    meal.portion_size = data.get('portion_size', meal.portion_size)
+    meal.portion_size = portion_size
     
-    meal.calculate_nutrition()
-    meal.save()
+    meal.save()  # Recalculates nutrition
     
     serializer = MealSerializer(meal)
     return Response(serializer.data, status=status.HTTP_200_OK)
@@ -226,40 +377,126 @@ def delete_meal(request, meal_id):
         return Response({"error": "Meal not found."}, status=status.HTTP_404_NOT_FOUND)
 
 #9. Create an API to receive step data from the fluter app:
-@swagger_auto_schema(method='post', request_body=StepHistorySerializer, responses={201: StepHistorySerializer})
+@swagger_auto_schema(method='post', request_body=StepHistorySerializer, responses={201: StepHistorySerializer, 202: 'Queued for a background write'})
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def record_steps(request):
-    """Record the steps taken by the user and calculate calories burned."""
+    """Add the steps taken by the user to today's step record and return the day's totals."""
     
-    data = request.data
-    steps = data.get('steps')
+    try:
+        sample = parse_step_sample({'steps': request.data.get('steps'), 'idempotency_key': request.data.get('idempotency_key')})
+    except ValueError as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
 
-    if steps is None:
-        return Response({'error': 'Steps are required.'}, status=status.HTTP_400_BAD_REQUEST)
+    if write_behind_enabled():
+        # Written to StepHistory by the background worker
+        get_step_queue().enqueue(request.user.pk, [sample])
+        return Response({'queued': 1}, status=status.HTTP_202_ACCEPTED)
 
-    # Create StepHistory object
-    step_history = StepHistory.objects.create(
-        user=request.user,
-        steps=steps,
-    )
+    ingest_step_samples(request.user, [sample])
 
-    # Return the created object with calories burned
+    # Return the day's step record with calories burned
+    step_history = StepHistory.objects.get(user=request.user, date=sample[0])
     serializer = StepHistorySerializer(step_history)
     return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+
+#9b. Receive a batch of timestamped step samples, e.g. an upload retried over a flaky connection
+@swagger_auto_schema(
+    method='post',
+    request_body=openapi.Schema(
+        type=openapi.TYPE_OBJECT,
+        properties={'samples': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'steps': openapi.Schema(type=openapi.TYPE_INTEGER),
+                'timestamp': openapi.Schema(type=openapi.TYPE_STRING, format=openapi.FORMAT_DATETIME),
+                'idempotency_key': openapi.Schema(type=openapi.TYPE_STRING),
+            },
+        ))},
+    ),
+    responses={
+        201: 'Accepted and duplicate sample counts with the updated days',
+        202: 'Queued for a background write',
+        207: 'Some samples were invalid',
+    },
+)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def record_steps_batch(request):
+    """Record a batch of step samples, dropping samples whose idempotency key was already counted."""
+    
+    samples = request.data.get('samples') if isinstance(request.data, dict) else request.data
+    if not isinstance(samples, list) or not samples:
+        return Response({'error': 'A non-empty list of samples is required.'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(samples) > MAX_STEP_BATCH_SIZE:
+        return Response({'error': f'At most {MAX_STEP_BATCH_SIZE} samples can be sent at once.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    valid = []
+    errors = []
+    for index, sample in enumerate(samples):
+        try:
+            valid.append(parse_step_sample(sample))
+        except ValueError as exc:
+            errors.append({'index': index, 'error': str(exc)})
+
+    if not valid:
+        return Response({'accepted': 0, 'duplicates': 0, 'days': [], 'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+    if write_behind_enabled():
+        # Duplicates are dropped when the background worker flushes the queue
+        get_step_queue().enqueue(request.user.pk, valid)
+        return Response({'queued': len(valid), 'errors': errors}, status=status.HTTP_202_ACCEPTED)
+
+    result = ingest_step_samples(request.user, valid)
+    days = StepHistory.objects.filter(user=request.user, date__in=result['dates']).order_by('date')
+
+    return Response({
+        'accepted': result['accepted'],
+        'duplicates': result['duplicates'],
+        'days': StepHistorySerializer(days, many=True).data,
+        'errors': errors,
+    }, status=status.HTTP_207_MULTI_STATUS if errors else status.HTTP_201_CREATED)
+
 #10.an API to view your step history and calories burned:
-@swagger_auto_schema(method='get', responses={200: StepHistorySerializer(many=True)})
+@swagger_auto_schema(
+    method='get',
+    manual_parameters=[
+        openapi.Parameter('bucket', openapi.IN_QUERY, description="Aggregate per day, week or month", type=openapi.TYPE_STRING, enum=list(STEP_BUCKETS)),
+        openapi.Parameter('range', openapi.IN_QUERY, description="Window ending today, e.g. 30d, 12w, 6m, 1y", type=openapi.TYPE_STRING),
+        openapi.Parameter('from', openapi.IN_QUERY, description="First date to include (YYYY-MM-DD)", type=openapi.TYPE_STRING),
+        openapi.Parameter('to', openapi.IN_QUERY, description="Last date to include (YYYY-MM-DD)", type=openapi.TYPE_STRING),
+    ],
+    responses={200: StepHistorySerializer(many=True)},
+)
 @api_view(['GET'])
+@renderer_classes([FastJSONRenderer, BrowsableAPIRenderer])
 @permission_classes([IsAuthenticated])
 def get_step_history(request):
-    """Retrieve the history of steps and calories burned by the user."""
+    """
+    Retrieve the history of steps and calories burned by the user. With a bucket or
+    range, return server-side sums per day, week or month as parallel columns instead.
+    """
     
-    # Fetch step history for the authenticated user
-    step_history = StepHistory.objects.filter(user=request.user).order_by('-date')
+    params = request.GET
+    if not any(params.get(name) for name in ('bucket', 'range', 'from', 'to')):
+        # Fetch step history for the authenticated user
+        step_history = StepHistory.objects.filter(user=request.user).order_by('-date')
 
-    serializer = StepHistorySerializer(step_history, many=True)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+        # Same output as StepHistorySerializer(many=True), without the per-object field graph
+        return Response(row_encoder(StepHistorySerializer).encode_queryset(step_history), status=status.HTTP_200_OK)
+
+    try:
+        bucket, start, end = parse_step_window(params, timezone.now().date())
+    except ValueError as exc:
+        return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response({
+        "bucket": bucket,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        **bucket_step_history(request.user, start, end, bucket),
+    }, status=status.HTTP_200_OK)
 
 # 11- Retrieve calorie info (total consumed and remaining for the day)
 @swagger_auto_schema(method='get', responses={200: 'Total calories consumed, burned, and remaining for the day.'})
@@ -268,25 +505,15 @@ def get_step_history(request):
 def get_calorie_info(request):
     """Retrieve the total calories consumed, burned, and remaining calories for the day."""
     
-    # Get total calories consumed from meals
-    total_calories_consumed = Meal.objects.filter(
-        user=request.user, 
-        date=timezone.now().date()
-    ).aggregate(total_calories=Sum('calories'))['total_calories'] or Decimal('0.0')
-
-    # Get total steps taken today
-    total_steps = StepHistory.objects.filter(
-        user=request.user, 
+    # Today's totals come from the DailySummary rollup maintained on every meal/step write
+    summary = DailySummary.objects.filter(
+        user=request.user,
         date=timezone.now().date()
-    ).aggregate(total_steps=Sum('steps'))['total_steps'] or 0
-    
-    # Calculate calories burned based on steps (0.04 calories per step as an example)
-    calories_burned_from_steps = total_steps * 0.04  # Assuming 0.04 calories burned per step
-    calories_burned_from_steps = Decimal(calories_burned_from_steps)
+    ).values_list('calories', 'calories_burned').first()
+    total_calories_consumed, calories_burned_from_steps = summary or (Decimal('0.0'), Decimal('0.0'))
     
-    # Get user's daily calorie goal from profile
-    user_profile = request.user.profile
-    daily_calorie_goal = user_profile.daily_calorie_goal  # Automatically calculated in profile
+    # Get user's daily calorie goal from the profile cache
+    daily_calorie_goal = get_profile_goal(request.user)['daily_calorie_goal']
     
     # Calculate remaining calories: goal - consumed + burned calories
     remaining_calories = daily_calorie_goal - total_calories_consumed + calories_burned_from_steps
@@ -297,4 +524,57 @@ def get_calorie_info(request):
         'total_calories_consumed': str(total_calories_consumed),  # Total calories consumed today
         'calories_burned_from_steps': str(calories_burned_from_steps),  # Calories burned from steps
         'remaining_calories': str(remaining_calories),  # Remaining calories for the day
-    }, status=status.HTTP_200_OK)
\ No newline at end of file
+    }, status=status.HTTP_200_OK)
+
+
+# 12- Export the full meal and step history as a streamed download
+@swagger_auto_schema(
+    method='get',
+    manual_parameters=[
+        openapi.Parameter('format', openapi.IN_QUERY, description="ndjson (default) or csv", type=openapi.TYPE_STRING, enum=list(EXPORT_FORMATS)),
+        openapi.Parameter('from', openapi.IN_QUERY, description="First date to include (YYYY-MM-DD)", type=openapi.TYPE_STRING),
+        openapi.Parameter('to', openapi.IN_QUERY, description="Last date to include (YYYY-MM-DD)", type=openapi.TYPE_STRING),
+        openapi.Parameter('user', openapi.IN_QUERY, description="Staff only: id of the patient to export", type=openapi.TYPE_INTEGER),
+    ],
+    responses={200: 'NDJSON (a user line, then one line per meal and step record) or CSV'},
+)
+@api_view(['GET'])
+@renderer_classes([JSONRenderer])
+@permission_classes([IsAuthenticated])
+def export_history(request):
+    """
+    Stream every meal and step record of the user, oldest first. Staff (e.g. the
+    clinicians following diabetic patients) can export another user with ``user``.
+    """
+
+    export_format = request.query_params.get('format') or 'ndjson'
+    if export_format not in EXPORT_FORMATS:
+        return Response({"error": f"Invalid format. Choose one of: {', '.join(EXPORT_FORMATS)}."}, status=status.HTTP_400_BAD_REQUEST)
+
+    user = request.user
+    if request.query_params.get('user'):
+        if not user.is_staff:
+            return Response({"error": "Only staff can export another user's history."}, status=status.HTTP_403_FORBIDDEN)
+        try:
+            user = User.objects.get(pk=int(request.query_params['user']))
+        except (ValueError, User.DoesNotExist):
+            return Response({"error": "User not found."}, status=status.HTTP_404_NOT_FOUND)
+
+    try:
+        start = parse_date_param(request.query_params['from']) if request.query_params.get('from') else None
+        end = parse_date_param(request.query_params['to']) if request.query_params.get('to') else None
+    except ValueError:
+        return Response({"error": "Invalid date format. Use YYYY-MM-DD."}, status=status.HTTP_400_BAD_REQUEST)
+
+    meals, steps = export_querysets(user, start, end)
+    if export_format == 'csv':
+        response = StreamingHttpResponse(stream_csv(meals, steps), content_type='text/csv; charset=utf-8')
+    else:
+        response = StreamingHttpResponse(stream_ndjson(user, meals, steps), content_type='application/x-ndjson')
+    filename = f'diet-export-{user.pk}-{timezone.now().date().isoformat()}.{export_format}'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+# @api_view has no decorator for the content negotiation class
+export_history.cls.content_negotiation_class = ExportContentNegotiation
@@ -0,0 +1,74 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+# PRAGMAs that take a keyword rather than a number
+KEYWORD_PRAGMAS = {
+    'journal_mode': {'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'},
+    'synchronous': {'OFF', 'NORMAL', 'FULL', 'EXTRA'},
+    'temp_store': {'DEFAULT', 'FILE', 'MEMORY'},
+}
+TRANSACTION_MODES = {'DEFERRED', 'IMMEDIATE', 'EXCLUSIVE'}
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    SQLite backend that applies the PRAGMAs in ``OPTIONS['pragmas']`` to every new
+    connection (WAL journal, synchronous=NORMAL, mmap, page cache and busy timeout
+    in project/settings.py), and whose health check actually queries the connection,
+    so CONN_MAX_AGE with CONN_HEALTH_CHECKS can keep connections open across requests.
+
+    ``OPTIONS['transaction_mode']`` picks how atomic() blocks begin. Django 4.2
+    always issues a deferred BEGIN, which takes the write lock only at the first
+    write; when a transaction that has already read tries to write while another
+    connection holds the lock, SQLite fails at once with "database is locked"
+    instead of waiting for busy_timeout. ``IMMEDIATE`` takes the write lock at
+    BEGIN, where busy_timeout applies, so concurrent writers queue up instead.
+    """
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        # sqlite3.connect() does not know about these; they are applied by this wrapper
+        params.pop('pragmas', None)
+        params.pop('transaction_mode', None)
+        return params
+
+    def get_transaction_mode(self):
+        mode = str(self.settings_dict['OPTIONS'].get('transaction_mode') or 'DEFERRED').upper()
+        if mode not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(f'Invalid SQLite transaction_mode {mode}.')
+        return mode
+
+    def get_pragma_statements(self):
+        statements = []
+        for name, value in self.settings_dict['OPTIONS'].get('pragmas', {}).items():
+            if value is None or value == '':
+                continue
+            if name in KEYWORD_PRAGMAS:
+                value = str(value).upper()
+                if value not in KEYWORD_PRAGMAS[name]:
+                    raise ImproperlyConfigured(f'Invalid SQLite PRAGMA {name} = {value}.')
+            else:
+                try:
+                    value = int(value)
+                except (TypeError, ValueError):
+                    raise ImproperlyConfigured(f'SQLite PRAGMA {name} needs an integer, got {value!r}.')
+            if not name.isidentifier():
+                raise ImproperlyConfigured(f'Invalid SQLite PRAGMA name {name!r}.')
+            statements.append(f'PRAGMA {name} = {value}')
+        return statements
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for statement in self.get_pragma_statements():
+            conn.execute(statement).close()
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute(f'BEGIN {self.get_transaction_mode()}')
+
+    def is_usable(self):
+        try:
+            self.connection.execute('SELECT 1').close()
+        except base.Database.Error:
+            return False
+        return True
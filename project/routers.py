@@ -0,0 +1,121 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# The RequestPin of the request being handled
+_request_pin = ContextVar('db_request_pin', default=None)
+# This request (or, outside requests, this thread) has written to the primary
+_wrote = ContextVar('db_wrote_to_primary', default=False)
+
+
+def get_replicas():
+    return getattr(settings, 'DATABASE_REPLICA_ALIASES', [])
+
+
+def pin_key(user_id):
+    return f'db-pin:{user_id}'
+
+
+def get_pin_cache():
+    return caches[getattr(settings, 'DATABASE_PIN_CACHE', 'default')]
+
+
+def request_user_id(request):
+    user = getattr(request, 'user', None)
+    return user.pk if user is not None and user.is_authenticated else None
+
+
+class RequestPin:
+    """
+    Whether the user of a request wrote within the last DATABASE_PIN_SECONDS.
+
+    Looked up on the first replica read rather than when the request starts:
+    DRF authentication such as BasicAuthentication only sets ``request.user``
+    inside the view. The lookup is repeated if the user changes.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self.user_id = None
+        self.pinned = False
+
+    def is_pinned(self):
+        user_id = request_user_id(self.request)
+        if user_id is None:
+            return False
+        if user_id != self.user_id:
+            self.user_id = user_id
+            self.pinned = get_pin_cache().get(pin_key(user_id)) is not None
+        return self.pinned
+
+
+class PrimaryReplicaRouter:
+    """
+    Send reads of the REPLICA_APPS models to a random replica alias and every
+    write to the primary ('default').
+
+    Reads stay on the primary inside transactions, after the current request has
+    written, and for DATABASE_PIN_SECONDS after the requesting user's last write
+    (see ReplicaPinningMiddleware), so users always read their own writes.
+    Migrations only run on the primary; the replicas are copies of it.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = get_replicas()
+        if (
+            not replicas
+            or model._meta.app_label not in getattr(settings, 'REPLICA_APPS', ())
+            or _wrote.get()
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+            or (_request_pin.get() is not None and _request_pin.get().is_pinned())
+        ):
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        if get_replicas():
+            _wrote.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in get_replicas():
+            return False
+        return None
+
+
+class ReplicaPinningMiddleware:
+    """
+    Pin a user's reads to the primary for DATABASE_PIN_SECONDS after a request of
+    theirs wrote to it. Must come after AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not get_replicas():
+            return self.get_response(request)
+
+        pin_token = _request_pin.set(RequestPin(request))
+        wrote_token = _wrote.set(False)
+        try:
+            response = self.get_response(request)
+            wrote = _wrote.get()
+        finally:
+            _request_pin.reset(pin_token)
+            _wrote.reset(wrote_token)
+
+        # DRF sets request.user to the user it authenticated in the view
+        user_id = request_user_id(request)
+        if wrote and user_id is not None:
+            get_pin_cache().set(pin_key(user_id), True, getattr(settings, 'DATABASE_PIN_SECONDS', 5))
+        return response
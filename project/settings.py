@@ -11,9 +11,10 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
 from datetime import timedelta
 import os 
+import tempfile
 from django.conf import settings
 from django.conf.urls.static import static
 
@@ -84,7 +85,7 @@ SITE_ID = 2
 SOCIALACCOUNT_LOGIN_ON_GET=True
 
 AUTHENTICATION_BACKENDS = [
-   'django.contrib.auth.backends.ModelBackend',
+   'accounts.backends.ProfileModelBackend',  # ModelBackend that joins the profile when loading the user
    'allauth.account.auth_backends.AuthenticationBackend', 
 ]
 
@@ -103,11 +104,14 @@ SOCIALACCOUNT_PROVIDERS = {
 
 
 MIDDLEWARE = [
+    'diet.instrumentation.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'diet.profiling.RequestProfilingMiddleware',
+    'project.routers.ReplicaPinningMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'allauth.account.middleware.AccountMiddleware',
@@ -148,12 +152,117 @@ WSGI_APPLICATION = 'project.wsgi.application'
 # }
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'project.backends.sqlite3',  # django.db.backends.sqlite3 plus connection PRAGMAs
         'NAME': BASE_DIR / 'db.sqlite3',  # Correct path manipulation
+        # Keep connections open between requests, re-checking them before reuse
+        'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=600, cast=int),
+        'CONN_HEALTH_CHECKS': config('DB_CONN_HEALTH_CHECKS', default=True, cast=bool),
+        'OPTIONS': {
+            'pragmas': {
+                # WAL lets readers run while a meal or step write is in progress
+                'journal_mode': config('SQLITE_JOURNAL_MODE', default='WAL'),
+                'synchronous': config('SQLITE_SYNCHRONOUS', default='NORMAL'),
+                'mmap_size': config('SQLITE_MMAP_SIZE', default=268435456, cast=int),  # bytes
+                'cache_size': config('SQLITE_CACHE_SIZE', default=-64000, cast=int),  # negative = KiB
+                'busy_timeout': config('SQLITE_BUSY_TIMEOUT', default=5000, cast=int),  # milliseconds
+            },
+            # Take the write lock when a transaction begins, so writers wait out busy_timeout
+            'transaction_mode': config('SQLITE_TRANSACTION_MODE', default='IMMEDIATE'),
+        },
+        # A file rather than SQLite's shared in-memory database, whose table locks do not wait
+        # out busy_timeout, so tests of concurrent writers see the locking production does
+        'TEST': {
+            'NAME': config('SQLITE_TEST_NAME', default=os.path.join(tempfile.gettempdir(), f'diet-test-{os.getpid()}.sqlite3')),
+        },
     }
 }
 
 
+# Read replicas: DATABASE_REPLICAS lists SQLite files kept in sync with the primary
+# (e.g. by `manage.py replicate_sqlite`). Reads of the REPLICA_APPS models go to a
+# random replica, writes and everything else to 'default' (see project/routers.py).
+
+DATABASE_REPLICA_ALIASES = []
+for index, replica_name in enumerate(config('DATABASE_REPLICAS', default='', cast=Csv()), start=1):
+    DATABASE_REPLICA_ALIASES.append(f'replica{index}')
+    DATABASES[f'replica{index}'] = {**DATABASES['default'], 'NAME': replica_name, 'TEST': {'MIRROR': 'default'}}
+
+DATABASE_ROUTERS = ['project.routers.PrimaryReplicaRouter']
+REPLICA_APPS = ['diet']
+# A user's reads stay on the primary this long after they write, so they read their own writes.
+# The pins live in DATABASE_PIN_CACHE, which must be shared between workers in production.
+DATABASE_PIN_SECONDS = config('DATABASE_PIN_SECONDS', default=5, cast=int)
+DATABASE_PIN_CACHE = 'default'
+
+
+# Cache
+# Local memory by default; point this at a shared backend (Redis, Memcached, ...) in production
+# so that a catalogue version bump from import_food_data reaches every worker.
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default=''),
+    }
+}
+
+# Per-user calorie goal; LocMemCache evicts least recently used entries beyond MAX_ENTRIES
+CACHES['profiles'] = {
+    'BACKEND': config('PROFILE_CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+    'LOCATION': config('PROFILE_CACHE_LOCATION', default='profiles'),
+    'TIMEOUT': config('PROFILE_CACHE_TIMEOUT', default=600, cast=int),
+    'OPTIONS': {'MAX_ENTRIES': config('PROFILE_CACHE_MAX_ENTRIES', default=10000, cast=int)},
+}
+
+PROFILE_CACHE = 'profiles'
+DIET_CATALOGUE_CACHE = 'default'
+DIET_CATALOGUE_CACHE_TIMEOUT = config('DIET_CATALOGUE_CACHE_TIMEOUT', default=300, cast=int)
+
+
+# Step telemetry write-behind: record_steps answers 202 and a background thread
+# flushes coalesced batches into StepHistory (see diet/step_queue.py)
+
+DIET_STEP_WRITE_BEHIND = config('DIET_STEP_WRITE_BEHIND', default=False, cast=bool)
+DIET_STEP_QUEUE_BATCH_SIZE = config('DIET_STEP_QUEUE_BATCH_SIZE', default=500, cast=int)
+DIET_STEP_QUEUE_FLUSH_INTERVAL = config('DIET_STEP_QUEUE_FLUSH_INTERVAL', default=1.0, cast=float)
+# Directory of per-process JSON-lines spool files that survive restarts
+DIET_STEP_QUEUE_SPOOL_DIR = config('DIET_STEP_QUEUE_SPOOL_DIR', default='')
+# Failed flushes of a sample before it is dead-lettered
+DIET_STEP_QUEUE_MAX_ATTEMPTS = config('DIET_STEP_QUEUE_MAX_ATTEMPTS', default=5, cast=int)
+
+
+# Request instrumentation (see diet/instrumentation.py): Server-Timing headers, one JSON
+# log line per request on the diet.instrumentation logger and Prometheus text at /metrics/
+
+REQUEST_METRICS_ENABLED = config('REQUEST_METRICS_ENABLED', default=True, cast=bool)
+REQUEST_METRICS_SERVER_TIMING = config('REQUEST_METRICS_SERVER_TIMING', default=True, cast=bool)
+REQUEST_METRICS_TOKEN = config('REQUEST_METRICS_TOKEN', default='')  # Bearer token for scrapers; staff only when empty
+
+# Per-request profiling (see diet/profiling.py): staff add ?profile=1 or an X-Profile: 1 header,
+# and REQUEST_PROFILE_SAMPLE_RATE profiles that fraction of all requests. Uses pyinstrument
+# when it is installed, cProfile otherwise; files are listed at /profiles/.
+
+REQUEST_PROFILE_SAMPLE_RATE = config('REQUEST_PROFILE_SAMPLE_RATE', default=0.0, cast=float)
+REQUEST_PROFILE_INTERVAL = config('REQUEST_PROFILE_INTERVAL', default=0.001, cast=float)  # Seconds between stack samples
+REQUEST_PROFILE_DIR = config('REQUEST_PROFILE_DIR', default=os.path.join(BASE_DIR, 'profiles'))
+REQUEST_PROFILE_KEEP = config('REQUEST_PROFILE_KEEP', default=200, cast=int)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'diet.instrumentation': {
+            'handlers': ['console'],
+            'level': config('REQUEST_METRICS_LOG_LEVEL', default='INFO'),
+            'propagate': False,
+        },
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
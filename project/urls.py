@@ -21,6 +21,8 @@ from django.conf.urls.static import static
 from drf_yasg import openapi
 from rest_framework import permissions
 from drf_yasg.views import get_schema_view as swagger_get_schema_view
+from diet.instrumentation import metrics_view
+from diet.profiling import profile_download, profile_list
 
 # Define schema view for Swagger documentation
 schema_view = swagger_get_schema_view (
@@ -45,6 +47,9 @@ urlpatterns = [
     # path('medication/', include(('medication.urls'), namespace='medication')),
     # path('footcare/', include(('footcare.urls', 'footcare'), namespace='footcare')),
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='swagger-ui'),
+    path('metrics/', metrics_view, name='metrics'),
+    path('profiles/', profile_list, name='profile_list'),
+    path('profiles/<str:name>', profile_download, name='profile_download'),
     
     ] 
 